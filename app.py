@@ -1,57 +1,156 @@
+import asyncio
+import atexit
+import bisect
+import difflib
+import fcntl
+import hashlib
+import http.client
 import io
+import itertools
 import json
 import subprocess
 import logging
 import os
-from datetime import datetime
-from flask import Flask, render_template, request, jsonify, send_from_directory
-from fabric import Group
+import queue
+import random
+import re
+import shutil
+import socket
+import threading
+import time
+import sqlite3
+import ssl
+import string
+import urllib.parse
+import uuid
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor, wait
+from datetime import datetime, timedelta
+from flask import Flask, Response, render_template, request, jsonify, send_file, send_from_directory, url_for
+from fabric import Connection
+from fabric.runners import Remote
 from invoke.watchers import Responder
 from invoke.exceptions import CommandTimedOut
-from logging.handlers import RotatingFileHandler
+from paramiko.ssh_exception import AuthenticationException, SSHException
+from logging.handlers import QueueHandler, QueueListener
+from zoneinfo import ZoneInfo
 from functools import wraps
 
+import log_writer
+import static_assets
+
 # --- Logging Setup ---
 def setup_logging():
-    """Configure logging for access and events."""
-    # Create logs directory if it doesn't exist (race-condition safe for gunicorn workers)
-    try:
-        os.makedirs('logs', exist_ok=True)
-    except OSError:
-        pass  # Directory already exists or permission issue
-    
-    # Access log configuration
-    access_logger = logging.getLogger('access')
-    access_logger.setLevel(logging.INFO)
-    access_handler = RotatingFileHandler(
-        'logs/access.log',
-        maxBytes=10*1024*1024,  # 10MB
-        backupCount=10
-    )
-    access_formatter = logging.Formatter(
-        '%(asctime)s | %(remote_addr)s | %(method)s | %(path)s | %(status)s | %(user_agent)s'
-    )
-    access_handler.setFormatter(access_formatter)
-    access_logger.addHandler(access_handler)
+    """Configure logging for access and events.
+
+    Loggers only put records on an in-memory queue; a listener thread writes
+    them out, so requests never wait for disk I/O. Under gunicorn the
+    listener forwards them to the single log writer process started in
+    gunicorn.conf.py (FSC_LOG_SOCKET), which owns the files and rotates them
+    safely, or to stderr while it cannot be reached; otherwise this process
+    writes the files itself.
+    """
+    log_socket = os.environ.get('FSC_LOG_SOCKET')
+    if log_socket:
+        target = log_writer.WriterSocketHandler(log_socket)
+    else:
+        target = log_writer.DispatchHandler(log_writer.build_handlers('logs'))
     
-    # Events log configuration (errors, important events)
-    event_logger = logging.getLogger('events')
-    event_logger.setLevel(logging.INFO)
-    event_handler = RotatingFileHandler(
-        'logs/events.log',
-        maxBytes=10*1024*1024,  # 10MB
-        backupCount=10
-    )
-    event_formatter = logging.Formatter(
-        '%(asctime)s | %(levelname)s | %(message)s'
-    )
-    event_handler.setFormatter(event_formatter)
-    event_logger.addHandler(event_handler)
+    log_queue = queue.SimpleQueue()
+    listener = QueueListener(log_queue, target)
+    listener.start()
+    # Flush what is still queued when the worker exits
+    atexit.register(listener.stop)
     
-    return access_logger, event_logger
+    loggers = []
+    for name in ('access', 'events'):
+        logger = logging.getLogger(name)
+        logger.setLevel(logging.INFO)
+        logger.propagate = False
+        logger.addHandler(QueueHandler(log_queue))
+        loggers.append(logger)
+    return loggers
 
 access_log, event_log = setup_logging()
 
+# --- Metrics ---
+# Prometheus metrics served at /metrics. Under gunicorn every worker writes
+# its samples to PROMETHEUS_MULTIPROC_DIR (set in gunicorn.conf.py) and the
+# endpoint adds them up, so any worker can answer for all of them.
+try:
+    import prometheus_client
+    from prometheus_client import multiprocess
+except ImportError:
+    prometheus_client = None
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+
+class NoopMetric:
+    """Stand-in for metrics when prometheus_client is not installed."""
+
+    def labels(self, *args, **kwargs):
+        return self
+
+    def observe(self, value):
+        pass
+
+    def inc(self, amount=1):
+        pass
+
+    def dec(self, amount=1):
+        pass
+
+def metric(kind, name, documentation, labelnames=(), **kwargs):
+    if prometheus_client is None:
+        return NoopMetric()
+    return getattr(prometheus_client, kind)(name, documentation, labelnames, **kwargs)
+
+HTTP_REQUESTS = metric('Counter', 'fsc_http_requests_total', 'HTTP requests', ('method', 'endpoint', 'status'))
+HTTP_DURATION = metric('Histogram', 'fsc_http_request_duration_seconds', 'HTTP request latency',
+                       ('method', 'endpoint'), buckets=LATENCY_BUCKETS)
+SSH_CONNECT_DURATION = metric('Histogram', 'fsc_ssh_connect_duration_seconds',
+                              'Time to get an SSH connection to a host (pooled or new)', ('command',),
+                              buckets=LATENCY_BUCKETS)
+SSH_COMMAND_DURATION = metric('Histogram', 'fsc_ssh_command_duration_seconds',
+                              'Run time of a command on one host', ('command', 'status'), buckets=LATENCY_BUCKETS)
+GCLOUD_DURATION = metric('Histogram', 'fsc_gcloud_duration_seconds', 'gcloud CLI call latency',
+                         ('subcommand',), buckets=LATENCY_BUCKETS)
+ERRORS = metric('Counter', 'fsc_errors_total', 'Failed HTTP requests (5xx), SSH commands and gcloud calls',
+                ('component',))
+TIMEOUTS = metric('Counter', 'fsc_timeouts_total', 'SSH commands and gcloud calls that timed out', ('component',))
+SSH_CONNECT_RETRIES = metric('Counter', 'fsc_ssh_connect_retries_total',
+                             'SSH connects retried after a transient failure', ('command',))
+JOBS_IN_FLIGHT = metric('Gauge', 'fsc_jobs_in_flight', 'Background jobs currently running',
+                        multiprocess_mode='livesum')
+SSH_IN_FLIGHT = metric('Gauge', 'fsc_ssh_sessions_in_flight', 'Commands currently running on a host',
+                       multiprocess_mode='livesum')
+
+def metrics_registry():
+    """Registry to expose: the per-worker files when running multi-process, else this process."""
+    if os.environ.get('PROMETHEUS_MULTIPROC_DIR'):
+        registry = prometheus_client.CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        return registry
+    return prometheus_client.REGISTRY
+
+def run_gcloud(args, **kwargs):
+    """subprocess.run() for a gcloud command, recording its latency by subcommand."""
+    subcommand = ' '.join(arg for arg in args[1:4] if not arg.startswith('-')) or args[1].lstrip('-')
+    start = time.monotonic()
+    try:
+        result = subprocess.run(args, **kwargs)
+    except subprocess.TimeoutExpired:
+        TIMEOUTS.labels('gcloud').inc()
+        raise
+    except (subprocess.CalledProcessError, OSError):
+        ERRORS.labels('gcloud').inc()
+        raise
+    finally:
+        GCLOUD_DURATION.labels(subcommand).observe(time.monotonic() - start)
+    if result.returncode != 0:
+        ERRORS.labels('gcloud').inc()
+    return result
+
 # --- Flask Application Setup ---
 app = Flask(__name__)
 
@@ -60,12 +159,20 @@ app = Flask(__name__)
 def log_request():
     """Log all incoming requests."""
     request.start_time = datetime.now()
+    # Pick up commands.json changes saved through another worker
+    COMMAND_REGISTRY.refresh_if_changed()
 
 @app.after_request
 def log_response(response):
     """Log all responses with timing information."""
-    if request.endpoint != 'static' and request.endpoint != 'favicon':
+    if request.endpoint not in ('static', 'asset', 'favicon'):
         duration = datetime.now() - request.start_time
+        # Label by route pattern, not path, so /api/jobs/<job_id> is one series
+        endpoint = request.url_rule.rule if request.url_rule else 'unmatched'
+        HTTP_DURATION.labels(request.method, endpoint).observe(duration.total_seconds())
+        HTTP_REQUESTS.labels(request.method, endpoint, str(response.status_code)).inc()
+        if response.status_code >= 500:
+            ERRORS.labels('http').inc()
         access_log.info('', extra={
             'remote_addr': request.remote_addr,
             'method': request.method,
@@ -84,15 +191,11 @@ def log_event(level, message, **kwargs):
     """Helper function to log events with additional context."""
     context = " | ".join([f"{k}={v}" for k, v in kwargs.items()])
     full_message = f"{message} | {context}" if context else message
+    # Kept separately for JSON-lines output; must survive pickling to the log writer
+    fields = {k: v if v is None or isinstance(v, (str, int, float, bool)) else str(v) for k, v in kwargs.items()}
     
-    if level == 'info':
-        event_log.info(full_message)
-    elif level == 'warning':
-        event_log.warning(full_message)
-    elif level == 'error':
-        event_log.error(full_message)
-    elif level == 'critical':
-        event_log.critical(full_message)
+    if level in ('info', 'warning', 'error', 'critical'):
+        getattr(event_log, level)(full_message, extra={'event': message, 'fields': fields})
 
 # --- Error Handlers ---
 @app.errorhandler(404)
@@ -145,11 +248,195 @@ def load_commands():
 
 COMMAND_OPTIONS = load_commands()
 
+# --- Command registry ---
+RESPONDER_WINDOW = 64 * 1024  # characters of unmatched output a response pattern is searched in
+
+class CompiledResponder(Responder):
+    """Responder that matches with a regex compiled once when commands load.
+
+    It is fed only the output that is new since the last call (see
+    CappedRemote) and keeps at most RESPONDER_WINDOW characters that have not
+    matched yet, so a chatty command does not make every check rescan all of
+    its output.
+    """
+
+    def __init__(self, regex, response):
+        super().__init__(regex.pattern, response)
+        self.regex = regex
+        self.pending = ''
+
+    def feed(self, data):
+        """Return the responses to send for a new chunk of output."""
+        self.pending = (self.pending + data)[-RESPONDER_WINDOW:]
+        matches = self.regex.findall(self.pending)
+        if matches:
+            # Like Responder: output that produced a response is not matched again
+            self.pending = ''
+        return [self.response] * len(matches)
+
+class CompiledCommand:
+    """A validated commands.json entry with its lookup prefix and response patterns."""
+
+    def __init__(self, name, info):
+        self.name = name
+        self.info = info
+        self.template = info['command']
+        self.prefix = self.template.split('{')[0]
+        self.responses = [(re.compile(pattern, re.S), response)
+                          for pattern, response in (info.get('responses') or {}).items()]
+
+    def get(self, key, default=None):
+        return self.info.get(key, default)
+
+    def watchers(self):
+        # Responders track how far they have read, so each run gets fresh ones
+        return [CompiledResponder(regex, response) for regex, response in self.responses]
+
+class CommandRegistry:
+    """Commands compiled from commands.json with exact-match and prefix indexes.
+
+    Every worker calls refresh_if_changed() before handling a request; it
+    compares the file's mtime/size/inode (at most once per second) so a save
+    handled by one gunicorn worker is picked up by all of them.
+    """
+    check_interval = 1.0
+    allowed_fields = {'extra_input'}
+
+    def __init__(self, path='commands.json'):
+        self.path = path
+        self.lock = threading.Lock()
+        self.signature = None
+        self.last_check = 0.0
+        self.by_name = {}
+        self.by_template = {}
+        self.prefix_index = {}
+        self.unindexed = []
+        self.errors = []
+
+    def file_signature(self):
+        try:
+            stat = os.stat(self.path)
+        except OSError:
+            return None
+        return (stat.st_mtime_ns, stat.st_size, stat.st_ino)
+
+    def validate(self, name, info):
+        if not isinstance(info.get('command'), str) or not info['command'].strip():
+            return "missing 'command'"
+        try:
+            fields = {field for _, field, _, _ in string.Formatter().parse(info['command']) if field is not None}
+        except ValueError as e:
+            return f"invalid command template: {e}"
+        if fields - self.allowed_fields:
+            return f"unknown placeholder(s): {', '.join(sorted(fields - self.allowed_fields))}"
+        if fields and not info.get('requires_extra_input'):
+            return "uses {extra_input} but requires_extra_input is not set"
+        if not isinstance(info.get('responses') or {}, dict):
+            return "'responses' must be an object"
+        for pattern in (info.get('responses') or {}):
+            try:
+                re.compile(pattern)
+            except re.error as e:
+                return f"invalid response pattern '{pattern}': {e}"
+        return None
+
+    def compile(self, commands, signature=None):
+        """Build the indexes for a commands dict; invalid entries are skipped."""
+        by_name, by_template, prefix_index, unindexed, errors = {}, {}, {}, [], []
+        for name, info in commands.items():
+            if name.startswith('_') or not isinstance(info, dict):
+                continue
+            error = self.validate(name, info)
+            if error:
+                errors.append(f"{name}: {error}")
+                continue
+            command = CompiledCommand(name, info)
+            by_name[name] = command
+            by_template.setdefault(command.template, command)
+            words = command.prefix.split(None, 1)
+            # Only bucket by first word when that word is complete in the prefix
+            if len(words) > 1 or (words and command.prefix != words[0]):
+                prefix_index.setdefault(words[0], []).append(command)
+            else:
+                unindexed.append(command)
+        for bucket in prefix_index.values():
+            bucket.sort(key=lambda c: len(c.prefix), reverse=True)
+        unindexed.sort(key=lambda c: len(c.prefix), reverse=True)
+        for error in errors:
+            log_event('warning', 'Invalid command definition skipped', error=error)
+        with self.lock:
+            self.by_name, self.by_template = by_name, by_template
+            self.prefix_index, self.unindexed, self.errors = prefix_index, unindexed, errors
+            self.signature = signature if signature is not None else self.file_signature()
+
+    def find(self, command_string):
+        """Return the command a formatted command string belongs to, or None."""
+        exact = self.by_template.get(command_string)
+        if exact:
+            return exact
+        words = command_string.split(None, 1)
+        candidates = self.prefix_index.get(words[0], []) if words else []
+        # Longest prefix wins, so overlapping commands resolve predictably
+        for command in candidates + self.unindexed:
+            if command_string.startswith(command.prefix):
+                return command
+        return None
+
+    def refresh_if_changed(self):
+        """Reload the application state if commands.json changed on disk."""
+        now = time.monotonic()
+        if now - self.last_check < self.check_interval:
+            return False
+        self.last_check = now
+        signature = self.file_signature()
+        if signature is None or signature == self.signature:
+            return False
+        try:
+            with open(self.path, 'r') as f:
+                json.load(f)
+        except (OSError, json.JSONDecodeError) as e:
+            # Keep serving the current commands rather than an empty set
+            log_event('warning', 'commands.json changed but could not be parsed, keeping current commands',
+                     error=str(e))
+            self.signature = signature
+            return False
+        reload_application_state()
+        return True
+
+COMMAND_REGISTRY = CommandRegistry()
+COMMAND_REGISTRY.compile(COMMAND_OPTIONS)
+
+def find_command_info(command_string):
+    """Return the compiled command matching a (formatted) command string."""
+    return COMMAND_REGISTRY.find(command_string)
+
 # Extract configuration from commands file
 def get_config():
     """Extract configuration from commands.json file."""
     config = {
-        'default_vm_filter': 'sru-fstudio-faz'
+        'default_vm_filter': 'sru-fstudio-faz',
+        'max_concurrency': 10,
+        'connect_timeout': 10,
+        'command_timeout': 0,
+        'connect_retries': 2,
+        'retry_backoff': 1.0,
+        'run_budget': 900,
+        'ssh_pool_size': 100,
+        'ssh_pool_idle_timeout': 300,
+        'gcloud_status_ttl': 300,
+        'inventory_max_age': 15,
+        'inventory_refresh_seconds': 10,
+        'inventory_idle_seconds': 120,
+        'vm_action_concurrency': 8,
+        'vm_stream_interval': 2,
+        'output_preview_bytes': 8192,
+        'workflow_boot_timeout': 900,
+        'workflow_ssh_timeout': 300,
+        'static_image_max_width': 1920,
+        'vm_backend': 'gcloud',
+        'compute_api_endpoint': 'https://compute.googleapis.com/compute/v1',
+        'gcp_projects': [],
+        'prewarm': {}
     }
     
     if '_config' in COMMAND_OPTIONS:
@@ -161,49 +448,748 @@ CONFIG = get_config()
 
 def reload_application_state():
     """Reload commands and configuration from files."""
-    global COMMAND_OPTIONS, CONFIG
+    global COMMAND_OPTIONS, CONFIG, VM_BACKEND
+    signature = COMMAND_REGISTRY.file_signature()
     COMMAND_OPTIONS = load_commands()
+    COMMAND_REGISTRY.compile(COMMAND_OPTIONS, signature)
     CONFIG = get_config()
+    VM_BACKEND = create_vm_backend(CONFIG)
+    SSH_POOL.configure(CONFIG['ssh_pool_size'], CONFIG['ssh_pool_idle_timeout'])
+    GCLOUD_STATUS.ttl = CONFIG['gcloud_status_ttl']
     log_event('info', 'Application state reloaded', 
              command_count=len(COMMAND_OPTIONS),
              config=str(CONFIG))
     print(f"🔄 Application state reloaded: {len(COMMAND_OPTIONS)} commands, config: {CONFIG}")
 
+# --- Static assets ---
+# Files under static/ are built once per worker at startup into content-hashed,
+# precompressed copies (see static_assets.py) and served from /assets/ with
+# long-lived immutable caching. Templates link to them through asset_url().
+ASSET_BUILD_DIR = os.environ.get('FSC_ASSET_DIR', 'assets')
+ASSET_MAX_AGE = 365 * 24 * 3600
+
+def build_static_assets():
+    """Build the asset manifest, or return None to fall back to plain /static/ URLs."""
+    try:
+        manifest = static_assets.build(app.static_folder, ASSET_BUILD_DIR, CONFIG['static_image_max_width'])
+    except Exception as e:
+        log_event('warning', 'Static asset build failed, serving static/ as is',
+                 error=str(e),
+                 error_type=type(e).__name__)
+        return None
+    log_event('info', 'Static assets built', **manifest.stats())
+    return manifest
+
+STATIC_ASSETS = build_static_assets()
+
+@app.template_global()
+def asset_url(filename):
+    """URL of a file under static/: its hashed copy when built, else the plain static URL."""
+    path = STATIC_ASSETS.url_path(filename) if STATIC_ASSETS else None
+    if path is None:
+        return url_for('static', filename=filename)
+    return url_for('asset', filename=path)
+
+@app.route('/assets/<path:filename>')
+def asset(filename):
+    """Serve a hashed asset, precompressed or as WebP when the client accepts it."""
+    entry = STATIC_ASSETS.lookup(filename) if STATIC_ASSETS else None
+    if entry is None:
+        return jsonify({'error': 'Asset not found'}), 404
+    path, mimetype, encoding, vary = static_assets.select_variant(
+        entry, request.headers.get('Accept-Encoding'), request.headers.get('Accept'))
+    response = send_file(os.path.abspath(os.path.join(ASSET_BUILD_DIR, *path.split('/'))), mimetype=mimetype,
+                         etag=f"{entry['digest']}-{encoding or mimetype.rsplit('/', 1)[-1]}",
+                         max_age=ASSET_MAX_AGE, conditional=True)
+    if encoding:
+        response.headers['Content-Encoding'] = encoding
+    for header in vary:
+        response.vary.add(header)
+    response.cache_control.public = True
+    response.cache_control.immutable = True
+    return response
+
+# --- Shared state database ---
+# SQLite database shared by all gunicorn workers (background jobs, caches).
+STATE_DB = os.environ.get('FSC_STATE_DB', 'state.db')
+
+@contextmanager
+def state_db():
+    """Open a connection to the shared state database as a transaction."""
+    conn = sqlite3.connect(STATE_DB, timeout=30)
+    conn.row_factory = sqlite3.Row
+    try:
+        with conn:
+            yield conn
+    finally:
+        conn.close()
+
+STATE_DB_ADDED_COLUMNS = (
+    ('jobs', 'output_run_id', 'TEXT'),
+    ('job_hosts', 'output_url', 'TEXT'),
+    ('job_hosts', 'output_size', 'INTEGER'),
+    ('job_hosts', 'truncated', 'INTEGER'),
+)
+
+def init_state_db():
+    """Create the state database tables if they do not exist yet."""
+    with state_db() as db:
+        db.execute('PRAGMA journal_mode=WAL')
+        db.executescript('''
+            CREATE TABLE IF NOT EXISTS jobs (
+                id TEXT PRIMARY KEY,
+                command TEXT NOT NULL,
+                status TEXT NOT NULL,
+                host_count INTEGER NOT NULL,
+                username TEXT,
+                remote_addr TEXT,
+                worker_pid INTEGER,
+                output_run_id TEXT,
+                cancel_requested INTEGER NOT NULL DEFAULT 0,
+                created_at REAL NOT NULL,
+                started_at REAL,
+                finished_at REAL
+            );
+            CREATE TABLE IF NOT EXISTS job_hosts (
+                job_id TEXT NOT NULL,
+                position INTEGER NOT NULL,
+                host TEXT NOT NULL,
+                status TEXT NOT NULL,
+                stdout TEXT,
+                stderr TEXT,
+                error TEXT,
+                duration REAL,
+                output_url TEXT,
+                output_size INTEGER,
+                truncated INTEGER,
+                PRIMARY KEY (job_id, position)
+            );
+            CREATE INDEX IF NOT EXISTS idx_jobs_created ON jobs (created_at);
+            CREATE TABLE IF NOT EXISTS workflows (
+                id TEXT PRIMARY KEY,
+                command TEXT NOT NULL,
+                status TEXT NOT NULL,
+                vm_count INTEGER NOT NULL,
+                username TEXT,
+                remote_addr TEXT,
+                worker_pid INTEGER,
+                output_run_id TEXT,
+                cancel_requested INTEGER NOT NULL DEFAULT 0,
+                created_at REAL NOT NULL,
+                finished_at REAL
+            );
+            CREATE TABLE IF NOT EXISTS workflow_vms (
+                workflow_id TEXT NOT NULL,
+                position INTEGER NOT NULL,
+                name TEXT NOT NULL,
+                zone TEXT NOT NULL,
+                ip TEXT,
+                stage TEXT NOT NULL,
+                status TEXT NOT NULL,
+                stages TEXT,
+                stdout TEXT,
+                error TEXT,
+                duration REAL,
+                PRIMARY KEY (workflow_id, position)
+            );
+            CREATE INDEX IF NOT EXISTS idx_workflows_created ON workflows (created_at);
+            CREATE TABLE IF NOT EXISTS workshops (
+                seq INTEGER PRIMARY KEY AUTOINCREMENT,
+                id INTEGER NOT NULL UNIQUE,
+                date TEXT NOT NULL,
+                workshop_type TEXT,
+                data TEXT NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS idx_workshops_date ON workshops (date);
+            CREATE INDEX IF NOT EXISTS idx_workshops_type ON workshops (workshop_type, date);
+            CREATE TABLE IF NOT EXISTS workshop_store (
+                id INTEGER PRIMARY KEY CHECK (id = 1),
+                version INTEGER NOT NULL,
+                file_signature TEXT
+            );
+            CREATE TABLE IF NOT EXISTS prewarm_runs (
+                date TEXT NOT NULL,
+                workshop_type TEXT NOT NULL,
+                dry_run INTEGER NOT NULL,
+                status TEXT NOT NULL,
+                vm_count INTEGER NOT NULL,
+                vm_names TEXT,
+                job_id TEXT,
+                detail TEXT,
+                worker_pid INTEGER,
+                started_at REAL NOT NULL,
+                ready_at REAL,
+                finished_at REAL,
+                PRIMARY KEY (date, workshop_type, dry_run)
+            );
+            CREATE TABLE IF NOT EXISTS shared_cache (
+                key TEXT PRIMARY KEY,
+                value TEXT NOT NULL,
+                updated_at REAL NOT NULL
+            );
+        ''')
+        # CREATE TABLE IF NOT EXISTS leaves databases from older versions as
+        # they were; add the columns introduced since
+        for table, column, definition in STATE_DB_ADDED_COLUMNS:
+            columns = {row['name'] for row in db.execute(f'PRAGMA table_info({table})')}
+            if column not in columns:
+                try:
+                    db.execute(f'ALTER TABLE {table} ADD COLUMN {column} {definition}')
+                except sqlite3.OperationalError as e:
+                    # Another worker added it first
+                    if 'duplicate column' not in str(e):
+                        raise
+
+init_state_db()
+
+def shared_cache_get(key):
+    """Return (value, updated_at) of a cache entry shared by all workers, or (None, 0)."""
+    with state_db() as db:
+        row = db.execute('SELECT value, updated_at FROM shared_cache WHERE key = ?', (key,)).fetchone()
+    return (json.loads(row['value']), row['updated_at']) if row else (None, 0)
+
+def shared_cache_set(key, value):
+    """Store a JSON-serialisable value in the cache shared by all workers."""
+    with state_db() as db:
+        db.execute('INSERT OR REPLACE INTO shared_cache (key, value, updated_at) VALUES (?, ?, ?)',
+                   (key, json.dumps(value), time.time()))
+
 # --- API Endpoints for Google Cloud ---
 
+# --- VM backends ---
+class VMBackend:
+    """Interface for listing and controlling Compute Engine VMs.
+
+    Instances are returned in the shape produced by the gcloud inventory
+    format: name, zone (URL), status and networkInterfaces[0].accessConfigs[0].natIP.
+    ``project`` selects a GCP project; None uses the backend's default project.
+    """
+    name = ''
+
+    def list_instances(self, filter_value, project=None):
+        raise NotImplementedError
+
+    def instance_action(self, action, zone, names, project=None):
+        """Start/stop/... the named VMs in one zone; returns {name: error or None}."""
+        raise NotImplementedError
+
+    def status(self):
+        """Health information in the format of check_gcloud_cli()."""
+        raise NotImplementedError
+
+class GcloudCLIBackend(VMBackend):
+    """VM backend that shells out to the gcloud CLI."""
+    name = 'gcloud'
+
+    def list_instances(self, filter_value, project=None):
+        gcloud_command = [
+            'gcloud', 'compute', 'instances', 'list',
+            f'--filter={filter_value}',
+            INVENTORY_FORMAT
+        ]
+        if project:
+            gcloud_command.append(f'--project={project}')
+        result = run_gcloud(gcloud_command, capture_output=True, text=True, check=True, timeout=30)
+        return json.loads(result.stdout)
+
+    def instance_action(self, action, zone, names, project=None):
+        gcloud_command = ['gcloud', 'compute', 'instances', action, *names, f'--zone={zone}', '--async']
+        if project:
+            gcloud_command.append(f'--project={project}')
+        try:
+            run_gcloud(gcloud_command, capture_output=True, text=True, check=True, timeout=120)
+            return {name: None for name in names}
+        except subprocess.CalledProcessError as e:
+            error = (e.stderr or str(e)).strip()
+            # gcloud names the instances it could not act on; the rest were dispatched
+            failed = [name for name in names if re.search(rf"(?<![-\w]){re.escape(name)}(?![-\w])", error)]
+            return {name: (error if name in failed or not failed else None) for name in names}
+        except Exception as e:
+            return {name: str(e) for name in names}
+
+    def status(self):
+        return check_gcloud_cli()
+
+class ComputeAPIError(Exception):
+    """Error response from the Compute Engine REST API."""
+
+    def __init__(self, status, message):
+        super().__init__(f"HTTP {status}: {message}")
+        self.status = status
+
+class HTTPConnectionPool:
+    """Thread-safe pool of keep-alive HTTP(S) connections to one host."""
+
+    def __init__(self, base_url, max_size=10, timeout=30):
+        parsed = urllib.parse.urlsplit(base_url)
+        self.https = parsed.scheme == 'https'
+        self.host = parsed.hostname
+        self.port = parsed.port or (443 if self.https else 80)
+        self.base_path = parsed.path.rstrip('/')
+        self.timeout = timeout
+        self.idle = queue.LifoQueue(maxsize=max_size)
+        self.stats = {'requests': 0, 'connections_opened': 0}
+
+    def new_connection(self):
+        self.stats['connections_opened'] += 1
+        if self.https:
+            return http.client.HTTPSConnection(self.host, self.port, timeout=self.timeout,
+                                               context=ssl.create_default_context())
+        return http.client.HTTPConnection(self.host, self.port, timeout=self.timeout)
+
+    def request(self, method, path, body=None, headers=None):
+        """Send a request and return (status, body bytes)."""
+        for attempt in range(2):
+            try:
+                conn, reused = self.idle.get_nowait(), True
+            except queue.Empty:
+                conn, reused = self.new_connection(), False
+            try:
+                conn.request(method, self.base_path + path, body=body, headers=headers or {})
+                response = conn.getresponse()
+                data = response.read()
+            except (http.client.HTTPException, ConnectionError):
+                conn.close()
+                # A pooled connection may have been closed by the server while idle
+                if reused and attempt == 0:
+                    continue
+                raise
+            self.stats['requests'] += 1
+            if response.will_close:
+                conn.close()
+            else:
+                try:
+                    self.idle.put_nowait(conn)
+                except queue.Full:
+                    conn.close()
+            return response.status, data
+
+class AccessTokenCache:
+    """Caches an OAuth access token for the Compute REST API.
+
+    Uses GOOGLE_OAUTH_ACCESS_TOKEN when set, otherwise asks gcloud once and
+    reuses the token until shortly before it expires.
+    """
+    lifetime = 45 * 60  # gcloud access tokens are valid for 60 minutes
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.token = None
+        self.expires_at = 0
+
+    def get(self):
+        with self.lock:
+            if self.token and time.monotonic() < self.expires_at:
+                return self.token
+            token = os.environ.get('GOOGLE_OAUTH_ACCESS_TOKEN')
+            if not token:
+                result = run_gcloud(['gcloud', 'auth', 'print-access-token'],
+                                    capture_output=True, text=True, check=True, timeout=30)
+                token = result.stdout.strip()
+            self.token, self.expires_at = token, time.monotonic() + self.lifetime
+            return token
+
+    def invalidate(self):
+        with self.lock:
+            self.token = None
+
+class ComputeRESTBackend(VMBackend):
+    """VM backend that talks to the Compute Engine REST API directly."""
+    name = 'rest'
+    page_size = 500
+
+    def __init__(self, endpoint, project=None):
+        self.endpoint = endpoint
+        self.project_override = project
+        self.project_cache = None
+        self.http = HTTPConnectionPool(endpoint)
+        self.tokens = AccessTokenCache()
+
+    @property
+    def project(self):
+        if self.project_override:
+            return self.project_override
+        if self.project_cache is None:
+            result = run_gcloud(['gcloud', 'config', 'get-value', 'project'],
+                                capture_output=True, text=True, timeout=30)
+            self.project_cache = result.stdout.strip()
+        return self.project_cache
+
+    def call(self, method, path, params=None):
+        if params:
+            path += '?' + urllib.parse.urlencode(params)
+        for attempt in range(2):
+            headers = {'Authorization': f'Bearer {self.tokens.get()}', 'Accept': 'application/json'}
+            if method == 'POST':
+                headers['Content-Length'] = '0'
+            status, data = self.http.request(method, path, headers=headers)
+            if status == 401 and attempt == 0:
+                self.tokens.invalidate()
+                continue
+            payload = json.loads(data or b'{}')
+            if status >= 400:
+                raise ComputeAPIError(status, payload.get('error', {}).get('message', data[:200].decode(errors='replace')))
+            return payload
+
+    def list_instances(self, filter_value, project=None):
+        project = project or self.project
+        predicate = compile_vm_filter(filter_value)
+        if predicate is None:
+            # The API's filter syntax differs from gcloud's; let gcloud evaluate the rest
+            log_event('info', 'Filter not supported by the Compute REST backend, using gcloud',
+                     filter=filter_value,
+                     project=project)
+            return GcloudCLIBackend().list_instances(filter_value, project)
+        params = {
+            'maxResults': self.page_size,
+            'returnPartialSuccess': 'true',
+            'fields': 'items/*/instances(name,zone,status,networkInterfaces/accessConfigs/natIP),nextPageToken'
+        }
+        # Narrow the listing server-side on the first name term of the filter;
+        # the predicate still decides, so this only has to match a superset
+        name_filter = self.name_filter(parse_vm_filter(filter_value))
+        if name_filter:
+            params['filter'] = name_filter
+        instances = []
+        while True:
+            page = self.call('GET', f'/projects/{project}/aggregated/instances', params)
+            for scope in page.get('items', {}).values():
+                for instance in scope.get('instances', []):
+                    vm = {
+                        'name': instance['name'],
+                        'zone': instance['zone'],
+                        'status': instance['status'],
+                        'networkInterfaces': [{'accessConfigs': [
+                            {'natIP': config['natIP']}
+                            for config in interface.get('accessConfigs', []) if config.get('natIP')
+                        ]} for interface in instance.get('networkInterfaces', [])]
+                    }
+                    if predicate(vm):
+                        instances.append(vm)
+            if not page.get('nextPageToken'):
+                return instances
+            params['pageToken'] = page['nextPageToken']
+
+    @staticmethod
+    def name_filter(terms):
+        """API filter (an RE2 full match on name) for the first usable name term, or None."""
+        for name, op, value in terms:
+            if name != 'name' or op not in ('~', ':', '=') or '"' in value or '\\' in value:
+                continue
+            if op == '~':
+                return f'name eq ".*{value}.*"'
+            # Instance names are lower case; ':' and '=' are literal matches
+            literal = re.escape(value.lower())
+            return f'name eq ".*{literal}.*"' if op == ':' else f'name eq "{literal}"'
+        return None
+
+    def instance_action(self, action, zone, names, project=None):
+        project = project or self.project
+
+        def act(name):
+            try:
+                self.call('POST', f'/projects/{project}/zones/{zone}/instances/{name}/{action}')
+                return name, None
+            except Exception as e:
+                return name, str(e)
+        # Operations are asynchronous server-side; requests share pooled connections
+        with ThreadPoolExecutor(max_workers=min(len(names), 8)) as executor:
+            return dict(executor.map(act, names))
+
+    def status(self):
+        status = {'installed': True, 'authenticated': False, 'project_set': False,
+                  'account': f'Compute REST API ({self.http.host})', 'project': '', 'errors': [], 'warnings': []}
+        try:
+            self.tokens.get()
+            status['authenticated'] = True
+        except Exception as e:
+            status['errors'].append(f"Could not get an access token for the Compute REST API: {e}")
+            return status
+        try:
+            status['project'] = self.project
+            status['project_set'] = bool(status['project'])
+        except Exception as e:
+            status['errors'].append(f"Could not determine the GCP project: {e}")
+        if not status['project_set'] and not status['errors']:
+            status['warnings'].append("No GCP project configured. Set gcp_project in _config or run: gcloud config set project YOUR_PROJECT_ID")
+        return status
+
+def create_vm_backend(config):
+    """Build the VM backend selected by _config.vm_backend."""
+    if config.get('vm_backend') == 'rest':
+        return ComputeRESTBackend(config['compute_api_endpoint'], config.get('gcp_project'))
+    return GcloudCLIBackend()
+
+VM_BACKEND = create_vm_backend(CONFIG)
+
+# --- VM inventory cache ---
+# One inventory of all "sru" VMs is shared by every worker through the state
+# database. A single background poller (whichever worker holds the poller
+# lock) keeps it fresh while someone is looking at it, and the /get-vms filter
+# is applied in-process, so open browser tabs do not each spawn gcloud.
+# With _config.gcp_projects set, every project is listed concurrently and the
+# results are merged, each VM tagged with its project.
+INVENTORY_BASE_FILTER = 'name~sru'
+INVENTORY_FORMAT = '--format=json(name,zone,status,networkInterfaces[0].accessConfigs[0].natIP)'
+INVENTORY_REFRESH_LOCK = STATE_DB + '.inventory.lock'
+INVENTORY_POLLER_LOCK = STATE_DB + '.poller.lock'
+INVENTORY_THREAD_LOCK = threading.Lock()
+INVENTORY_FILTER_TERM = re.compile(r'^([A-Za-z_.\[\]0-9]+?)\s*(!=|!~|=|~|:)\s*(.+)$')
+INVENTORY_PROJECT_TIMEOUT = 20  # seconds to wait for one project before using its last known VMs
+INVENTORY_EXECUTOR = ThreadPoolExecutor(max_workers=16, thread_name_prefix='inventory')
+GCP_PROJECT_PATTERN = re.compile(r'^([a-z0-9.-]+:)?[a-z][-a-z0-9]{4,28}[a-z0-9]$')
+INVENTORY_FILTER_FIELDS = {
+    'name': lambda vm: vm.get('name', ''),
+    'project': lambda vm: vm.get('project', ''),
+    'status': lambda vm: vm.get('status', ''),
+    'zone': lambda vm: vm.get('zone', ''),
+    'natIP': lambda vm: vm_ip(vm) or '',
+    'networkInterfaces[0].accessConfigs[0].natIP': lambda vm: vm_ip(vm) or ''
+}
+inventory_demand_written = 0.0
+
+def vm_ip(vm):
+    """External IP of a VM as returned by the inventory format, or None."""
+    try:
+        return vm['networkInterfaces'][0]['accessConfigs'][0]['natIP']
+    except (KeyError, IndexError, TypeError):
+        return None
+
+def parse_vm_filter(filter_value):
+    """Split a gcloud-style filter into (field, operator, unquoted value) terms.
+
+    Returns None for anything compile_vm_filter() cannot evaluate.
+    """
+    if re.search(r'\bOR\b|\bNOT\b|[()]|^-|\s-', filter_value):
+        return None
+    terms = []
+    for term in re.split(r'\s+AND\s+|\s+', filter_value.strip()):
+        if not term:
+            continue
+        match = INVENTORY_FILTER_TERM.match(term)
+        if not match or match.group(1) not in INVENTORY_FILTER_FIELDS:
+            return None
+        terms.append((match.group(1), match.group(2), match.group(3).strip('"\'')))
+    return terms
+
+def compile_vm_filter(filter_value):
+    """Compile a gcloud-style filter into a predicate over inventory entries.
+
+    Supports ``AND``-joined terms using the ``=``, ``!=``, ``:``, ``~`` and
+    ``!~`` operators on name, status, zone and natIP. Returns None for
+    anything else (OR, NOT, parentheses, other fields) so the caller can fall
+    back to asking gcloud directly.
+    """
+    terms = parse_vm_filter(filter_value)
+    if terms is None:
+        return None
+    checks = []
+    for name, op, value in terms:
+        field = INVENTORY_FILTER_FIELDS[name]
+        if op in ('~', '!~'):
+            try:
+                pattern = re.compile(value)
+            except re.error:
+                return None
+            checks.append(lambda vm, f=field, p=pattern, neg=op == '!~': bool(p.search(f(vm))) != neg)
+        elif op == ':':
+            checks.append(lambda vm, f=field, v=value.lower(): v in f(vm).lower())
+        else:
+            # zone is a full URL in the inventory; compare on its last segment too
+            checks.append(lambda vm, f=field, v=value.lower(), neg=op == '!=':
+                          (v in (f(vm).lower(), f(vm).rsplit('/', 1)[-1].lower())) != neg)
+    return lambda vm: all(check(vm) for check in checks)
+
+def inventory_projects():
+    """Projects the inventory is listed from; [None] means the backend's default project."""
+    projects = CONFIG.get('gcp_projects') or []
+    if isinstance(projects, str):
+        projects = projects.split(',')
+    projects = [str(project).strip() for project in projects]
+    return list(dict.fromkeys(project for project in projects if project)) or [None]
+
+def list_project_instances(filter_value, previous=None):
+    """List instances from every configured project at once and merge them.
+
+    Returns (vms, per-project stats). A project that fails or does not answer
+    within INVENTORY_PROJECT_TIMEOUT does not hold up the others: its VMs from
+    ``previous`` are kept and marked stale in the stats. Only when every
+    project fails is the first error raised.
+    """
+    projects = inventory_projects()
+
+    def list_project(project):
+        start = time.monotonic()
+        vms = VM_BACKEND.list_instances(filter_value, project)
+        return vms, time.monotonic() - start
+
+    start = time.monotonic()
+    futures = [INVENTORY_EXECUTOR.submit(list_project, project) for project in projects]
+    wait(futures, timeout=INVENTORY_PROJECT_TIMEOUT)
+    vms, stats, errors = [], [], []
+    for project, future in zip(projects, futures):
+        stat = {'project': project or 'default', 'vm_count': 0, 'seconds': None, 'error': None, 'stale': False}
+        stats.append(stat)
+        try:
+            if not future.done():
+                future.cancel()
+                raise TimeoutError(f"No response after {INVENTORY_PROJECT_TIMEOUT}s")
+            project_vms, seconds = future.result()
+        except Exception as e:
+            errors.append(e)
+            # gcloud's own message is on stderr; str() of the exception is the command line
+            error = (getattr(e, 'stderr', None) or str(e) or type(e).__name__).strip()
+            stat.update(error=error, seconds=round(time.monotonic() - start, 3))
+            project_vms = [vm for vm in previous or [] if vm.get('project') == project]
+            stat['stale'] = bool(project_vms)
+            log_event('warning', 'Inventory listing failed for project',
+                     project=stat['project'],
+                     kept_vms=len(project_vms),
+                     error=stat['error'],
+                     error_type=type(e).__name__)
+        else:
+            stat['seconds'] = round(seconds, 3)
+            if project:
+                for vm in project_vms:
+                    vm['project'] = project
+        stat['vm_count'] = len(project_vms)
+        vms.extend(project_vms)
+    if len(errors) == len(projects):
+        raise errors[0]
+    return vms, stats
+
+def server_timing(stats):
+    """Server-Timing header value with the listing time of each project."""
+    entries = []
+    for stat in stats:
+        entry = re.sub(r'[^A-Za-z0-9_.-]', '_', stat['project'])
+        if stat['seconds'] is not None:
+            entry += f";dur={stat['seconds'] * 1000:.0f}"
+        if stat['error']:
+            desc = ('stale: ' if stat['stale'] else 'failed: ') + stat['error']
+            entry += ';desc="' + re.sub(r'["\\\r\n]', ' ', desc)[:200] + '"'
+        entries.append(entry)
+    return ', '.join(entries)
+
+def refresh_inventory(max_age=0):
+    """Refresh the shared inventory unless another worker or thread just did.
+
+    Refreshes are serialised across threads and workers, and the cache is
+    re-checked after acquiring the lock, so concurrent callers share one
+    gcloud call instead of each running their own.
+    """
+    with INVENTORY_THREAD_LOCK, open(INVENTORY_REFRESH_LOCK, 'a') as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            inventory, updated_at = shared_cache_get('inventory')
+            if inventory is not None and time.time() - updated_at < max_age:
+                return inventory, updated_at
+            inventory, stats = list_project_instances(INVENTORY_BASE_FILTER, inventory)
+            shared_cache_set('inventory', inventory)
+            shared_cache_set('inventory_projects', stats)
+            return inventory, time.time()
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+def get_inventory():
+    """Return (vms, updated_at) from the shared cache, refreshing it if too old."""
+    global inventory_demand_written
+    now = time.time()
+    if now - inventory_demand_written > 5:
+        shared_cache_set('inventory_demand', now)
+        inventory_demand_written = now
+    inventory, updated_at = shared_cache_get('inventory')
+    if inventory is None or now - updated_at >= CONFIG['inventory_max_age']:
+        inventory, updated_at = refresh_inventory(max_age=CONFIG['inventory_max_age'])
+    return inventory, updated_at
+
+def expire_inventory():
+    """Mark the shared inventory as stale so the next read refreshes it."""
+    with state_db() as db:
+        db.execute("UPDATE shared_cache SET updated_at = 0 WHERE key = 'inventory'")
+
+def run_inventory_poller():
+    """Keep the inventory fresh while it is being used; one worker at a time.
+
+    Every worker starts this thread, but only the one holding the poller lock
+    polls gcloud. The lock is released when that worker exits, at which point
+    another worker takes over.
+    """
+    lock_file = open(INVENTORY_POLLER_LOCK, 'a')
+    while True:
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            break
+        except OSError:
+            time.sleep(30)
+    while True:
+        interval = CONFIG['inventory_refresh_seconds']
+        try:
+            last_demand, _ = shared_cache_get('inventory_demand')
+            if last_demand and time.time() - last_demand < CONFIG['inventory_idle_seconds']:
+                refresh_inventory(max_age=interval / 2)
+        except Exception as e:
+            log_event('warning', 'Inventory refresh failed',
+                     error=str(e),
+                     error_type=type(e).__name__)
+        time.sleep(interval)
+
+threading.Thread(target=run_inventory_poller, name='inventory-poller', daemon=True).start()
+
+def get_vm_filter(args):
+    """Read the VM filter from the query string, forcing it to match "sru" VMs."""
+    # Get filter from query parameter, default to configured filter
+    default_filter = f"name~^{CONFIG['default_vm_filter']}"
+    filter_value = args.get('filter', default_filter)
+    
+    # Ensure filter always contains "sru" - if user provides custom filter, combine with sru
+    if filter_value != default_filter and 'sru' not in filter_value.lower():
+        # If custom filter doesn't contain sru, combine it with sru filter
+        if filter_value.startswith('name~'):
+            # Extract the pattern after name~
+            pattern = filter_value[5:]
+            filter_value = f"name~sru AND name~{pattern}"
+        else:
+            # Simple text search, combine with sru
+            filter_value = f"name~sru AND name~{filter_value}"
+    return filter_value
+
 @app.route('/get-vms')
 def get_gcp_vms():
     """Fetch a detailed list of VMs including name, zone, status and IP."""
     try:
-        # Get filter from query parameter, default to configured filter
-        default_filter = f"name~^{CONFIG['default_vm_filter']}"
-        filter_value = request.args.get('filter', default_filter)
-        
-        # Ensure filter always contains "sru" - if user provides custom filter, combine with sru
-        if filter_value != default_filter and 'sru' not in filter_value.lower():
-            # If custom filter doesn't contain sru, combine it with sru filter
-            if filter_value.startswith('name~'):
-                # Extract the pattern after name~
-                pattern = filter_value[5:]
-                filter_value = f"name~sru AND name~{pattern}"
-            else:
-                # Simple text search, combine with sru
-                filter_value = f"name~sru AND name~{filter_value}"
+        filter_value = get_vm_filter(request.args)
+        predicate = compile_vm_filter(filter_value)
+        if predicate is not None:
+            inventory, updated_at = get_inventory()
+            vms = [vm for vm in inventory if predicate(vm)]
+            cache_age = time.time() - updated_at
+            project_stats, _ = shared_cache_get('inventory_projects')
+        else:
+            # Filter cannot be evaluated against the cached inventory
+            vms, project_stats = list_project_instances(filter_value)
+            cache_age = 0.0
         
-        gcloud_command = [
-            'gcloud', 'compute', 'instances', 'list',
-            f'--filter={filter_value}',
-            '--format=json(name,zone,status,networkInterfaces[0].accessConfigs[0].natIP)'
-        ]
-        result = subprocess.run(gcloud_command, capture_output=True, text=True, check=True, timeout=30)
-        vms = json.loads(result.stdout)
+        body = json.dumps(vms)
+        etag = hashlib.sha1(body.encode()).hexdigest()
+        headers = {
+            'ETag': f'"{etag}"',
+            'Cache-Control': 'no-cache',
+            'X-Cache-Age': f'{cache_age:.1f}'
+        }
+        # Timings go in a header so they do not change the ETag of an unchanged VM list
+        if project_stats:
+            headers['Server-Timing'] = server_timing(project_stats)
+        if request.if_none_match.contains(etag):
+            return Response(status=304, headers=headers)
         
         log_event('info', 'VMs fetched successfully',
                  vm_count=len(vms),
                  filter=filter_value,
+                 cache_age=f'{cache_age:.1f}s',
                  remote_addr=request.remote_addr)
         
-        return jsonify(vms)
+        return Response(body, mimetype='application/json', headers=headers)
     except FileNotFoundError:
         log_event('error', 'gcloud command not found', remote_addr=request.remote_addr)
         return jsonify({'error': 'The "gcloud" command was not found. Is the Google Cloud CLI installed?'}), 500
@@ -212,6 +1198,11 @@ def get_gcp_vms():
                  error=e.stderr,
                  remote_addr=request.remote_addr)
         return jsonify({'error': f"Error executing gcloud (check login/project): {e.stderr}"}), 500
+    except ComputeAPIError as e:
+        log_event('error', 'Compute API request failed',
+                 error=str(e),
+                 remote_addr=request.remote_addr)
+        return jsonify({'error': f"Error from the Compute API (check credentials/project): {e}"}), 500
     except Exception as e:
         log_event('error', 'Unexpected error fetching VMs',
                  error=str(e),
@@ -219,148 +1210,1833 @@ def get_gcp_vms():
                  remote_addr=request.remote_addr)
         return jsonify({'error': f'An unexpected error occurred: {str(e)}'}), 500
 
+# --- VM status push ---
+VM_STREAM_MAX_SECONDS = 600  # browsers reconnect automatically and get a fresh snapshot
+# /execute-stream, /vms/stream and /api/logs?follow=1 each hold one of the
+# worker's gunicorn threads for up to ten minutes or the run budget. Only this many run at once per worker, so
+# that ordinary requests always find a free thread; further ones get a 503
+# and the client falls back to polling.
+MAX_LONG_STREAMS = int(os.environ.get('FSC_MAX_STREAMS', 4))
+LONG_STREAM_SLOTS = threading.BoundedSemaphore(MAX_LONG_STREAMS)
+
+def acquire_long_stream():
+    """Take a long-lived stream slot without waiting; False when all are in use."""
+    if LONG_STREAM_SLOTS.acquire(blocking=False):
+        return True
+    log_event('warning', 'Too many open streams, rejecting',
+             path=request.path,
+             max_streams=MAX_LONG_STREAMS,
+             remote_addr=request.remote_addr)
+    return False
+
+def long_stream_response(body, mimetype):
+    """Wrap a stream body in a Response that gives its slot back once the response is closed."""
+    response = Response(body, mimetype=mimetype, headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no'
+    })
+    response.call_on_close(LONG_STREAM_SLOTS.release)
+    return response
+
+def streams_busy_response():
+    return jsonify({'error': 'Too many open streams on this server; poll instead.'}), 503, {'Retry-After': '30'}
+
+class InventoryWatcher:
+    """Watches the shared inventory and pushes VM changes to subscribers.
+
+    There is one watcher per worker however many browser tabs are
+    subscribed. It only runs while someone is subscribed, and reading the
+    inventory through get_inventory() keeps the background poller going.
+    Subscribers receive (old, new) pairs for VMs whose status or IP changed
+    and apply their own filter. A subscriber that falls behind gets its queue
+    replaced by None, meaning "start again from the current snapshot".
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.subscribers = set()
+        self.thread = None
+        self.snapshot = None
+
+    @staticmethod
+    def key(vm):
+        return (vm.get('status'), vm_ip(vm), vm.get('zone'))
+
+    @staticmethod
+    def identity(vm):
+        # VM names are only unique within a project
+        return (vm.get('project'), vm['name'])
+
+    def subscribe(self):
+        events = queue.Queue(maxsize=100)
+        with self.lock:
+            self.subscribers.add(events)
+            if self.thread is None:
+                self.thread = threading.Thread(target=self.run, name='inventory-watcher', daemon=True)
+                self.thread.start()
+        return events
+
+    def unsubscribe(self, events):
+        with self.lock:
+            self.subscribers.discard(events)
+
+    def run(self):
+        self.snapshot = None
+        while True:
+            with self.lock:
+                if not self.subscribers:
+                    self.thread = None
+                    return
+            try:
+                inventory, _ = get_inventory()
+                current = {self.identity(vm): vm for vm in inventory}
+                previous, self.snapshot = self.snapshot, current
+                if previous is None:
+                    # Subscribers start from their own snapshot; only diffs from here on
+                    changes = []
+                else:
+                    changes = [(previous.get(identity), vm) for identity, vm in current.items()
+                               if identity not in previous or self.key(previous[identity]) != self.key(vm)]
+                    changes += [(vm, None) for identity, vm in previous.items() if identity not in current]
+                if changes:
+                    with self.lock:
+                        subscribers = list(self.subscribers)
+                    for events in subscribers:
+                        try:
+                            events.put_nowait(changes)
+                        except queue.Full:
+                            # Slow client: drop its backlog and have it resync instead
+                            while True:
+                                try:
+                                    events.get_nowait()
+                                except queue.Empty:
+                                    break
+                            events.put_nowait(None)
+            except Exception as e:
+                log_event('warning', 'Inventory watcher refresh failed',
+                         error=str(e),
+                         error_type=type(e).__name__)
+            time.sleep(CONFIG['vm_stream_interval'])
+
+INVENTORY_WATCHER = InventoryWatcher()
+
+@app.route('/vms/stream')
+def stream_vms():
+    """Push VM status/IP changes for a filter as Server-Sent Events."""
+    filter_value = get_vm_filter(request.args)
+    predicate = compile_vm_filter(filter_value)
+    if predicate is None:
+        return jsonify({'error': f"Filter '{filter_value}' cannot be streamed; use /get-vms instead."}), 400
+    try:
+        inventory, updated_at = get_inventory()
+    except Exception as e:
+        log_event('error', 'Unexpected error fetching VMs',
+                 error=str(e),
+                 error_type=type(e).__name__,
+                 remote_addr=request.remote_addr)
+        return jsonify({'error': f'Could not load the VM inventory: {e}'}), 500
+
+    if not acquire_long_stream():
+        return streams_busy_response()
+    events = INVENTORY_WATCHER.subscribe()
+
+    def generate():
+        deadline = time.monotonic() + VM_STREAM_MAX_SECONDS
+        try:
+            yield format_sse('snapshot', [vm for vm in inventory if predicate(vm)])
+            while time.monotonic() < deadline:
+                try:
+                    changes = events.get(timeout=STREAM_KEEPALIVE_SECONDS)
+                except queue.Empty:
+                    yield ': keepalive\n\n'
+                    continue
+                if changes is None:
+                    yield format_sse('snapshot', [vm for vm in INVENTORY_WATCHER.snapshot.values() if predicate(vm)])
+                    continue
+                changed, removed = [], []
+                for old, new in changes:
+                    if new is not None and predicate(new):
+                        changed.append(new)
+                    elif old is not None and predicate(old):
+                        removed.append({'project': old.get('project'), 'name': old['name']})
+                if changed or removed:
+                    yield format_sse('changes', {'changed': changed, 'removed': removed})
+        finally:
+            INVENTORY_WATCHER.unsubscribe(events)
+
+    return long_stream_response(generate(), 'text/event-stream')
+
+# --- Batched VM lifecycle actions ---
+VM_ACTIONS = ('start', 'stop', 'reset', 'suspend', 'resume')
+VM_ACTION_BATCH_SIZE = 50  # instance names per gcloud invocation
+VM_NAME_PATTERN = re.compile(r'^[a-z]([-a-z0-9]{0,61}[a-z0-9])?$')
+
+def run_vm_action(action, vms):
+    """Dispatch a lifecycle action for many VMs.
+
+    VMs are grouped by project and zone and sent as multi-instance gcloud
+    calls (at most VM_ACTION_BATCH_SIZE names each), with the batches running
+    concurrently. VMs without a project use the default project. Returns
+    per-VM results in input order and the total dispatch time.
+    """
+    start = time.monotonic()
+    results = []
+    batches = {}
+    for vm in vms:
+        name, zone = str(vm.get('name', '')), str(vm.get('zone', '')).rsplit('/', 1)[-1]
+        project = str(vm['project']) if vm.get('project') else None
+        result = {'name': name, 'zone': zone, 'project': project, 'success': False, 'error': None}
+        results.append(result)
+        if not VM_NAME_PATTERN.match(name) or not VM_NAME_PATTERN.match(zone):
+            result['error'] = 'Invalid VM name or zone'
+            continue
+        if project and not GCP_PROJECT_PATTERN.match(project):
+            result['error'] = 'Invalid project'
+            continue
+        batches.setdefault((project, zone), []).append(result)
+
+    calls = []
+    for (project, zone), zone_results in batches.items():
+        for i in range(0, len(zone_results), VM_ACTION_BATCH_SIZE):
+            calls.append((project, zone, zone_results[i:i + VM_ACTION_BATCH_SIZE]))
+
+    if calls:
+        with ThreadPoolExecutor(max_workers=min(len(calls), CONFIG['vm_action_concurrency'])) as executor:
+            outcomes = executor.map(lambda call: VM_BACKEND.instance_action(
+                action, call[1], [r['name'] for r in call[2]], call[0]), calls)
+            for (project, zone, call_results), outcome in zip(calls, outcomes):
+                for result in call_results:
+                    result['error'] = outcome.get(result['name'])
+                    result['success'] = result['error'] is None
+    return results, time.monotonic() - start
+
+def vm_action_response(action, vms):
+    """Run a VM lifecycle action for a request and build the JSON response."""
+    if not vms:
+        log_event('warning', f'{action.capitalize()} VMs called with no VMs', remote_addr=request.remote_addr)
+        return jsonify({'error': f'No VMs provided to {action}.'}), 400
+    
+    log_event('info', f'Dispatching VM {action}',
+             vm_count=len(vms),
+             vm_names=[vm.get('name') for vm in vms],
+             remote_addr=request.remote_addr)
+    
+    results, elapsed = run_vm_action(action, vms)
+    # Statuses change right away (e.g. TERMINATED -> STAGING); do not serve them from cache
+    expire_inventory()
+    
+    errors = []
+    for result in results:
+        if not result['success']:
+            errors.append(f"Could not {action} VM {result['name']}: {result['error']}")
+            log_event('error', f'Failed to {action} VM',
+                     vm_name=result['name'],
+                     zone=result['zone'],
+                     project=result['project'],
+                     error=result['error'],
+                     remote_addr=request.remote_addr)
+    
+    body = {'results': results, 'dispatch_seconds': round(elapsed, 2)}
+    if errors:
+        body['error'] = '. '.join(errors)
+        return jsonify(body), 500
+    
+    log_event('info', f'VMs {action} commands sent successfully',
+             vm_count=len(vms),
+             duration=f"{elapsed:.2f}s",
+             remote_addr=request.remote_addr)
+    body['success'] = f'{action.capitalize()} command for {len(vms)} VM(s) sent.'
+    return jsonify(body)
+
 @app.route('/start-vms', methods=['POST'])
 def start_gcp_vms():
     """Start a list of specific VMs by name and zone."""
     data = request.json
-    vms_to_start = data.get('vms')
-    if not vms_to_start:
-        log_event('warning', 'Start VMs called with no VMs', remote_addr=request.remote_addr)
-        return jsonify({'error': 'No VMs provided to start.'}), 400
+    return vm_action_response('start', data.get('vms'))
+
+@app.route('/vms/<action>', methods=['POST'])
+def vm_lifecycle_action(action):
+    """Start, stop, reset, suspend or resume a list of VMs by name and zone."""
+    if action not in VM_ACTIONS:
+        return jsonify({'error': f"Unknown action '{action}'. Use one of: {', '.join(VM_ACTIONS)}"}), 404
+    data = request.get_json(silent=True) or {}
+    return vm_action_response(action, data.get('vms'))
+
+
+# --- SSH connection pool ---
+class CappedRemote(Remote):
+    """fabric runner that keeps only a preview of a command's output in memory.
+
+    invoke's Runner appends everything a command prints to the lists that
+    become result.stdout/stderr, and joins them again for the watchers on
+    every chunk. Here at most output_preview_bytes characters per stream are
+    kept (the full output goes to out_stream, e.g. a SpoolFile) and watchers
+    are only given the new chunk, so memory per host stays bounded while the
+    command runs, not just after it.
+    """
+
+    def _handle_output(self, buffer_, hide, output, reader):
+        limit = CONFIG['output_preview_bytes']
+        kept = 0
+        for data in self.read_proc_output(reader):
+            if not hide:
+                self.write_our_output(stream=output, string=data)
+            if kept < limit:
+                buffer_.append(data[:limit - kept])
+                kept += len(buffer_[-1])
+            for watcher in self.watchers:
+                for response in watcher.feed(data):
+                    self.write_proc_stdin(response)
+
+class SSHConnectionPool:
+    """Per-worker pool of authenticated SSH connections keyed by (host, user).
+
+    Connections are checked out for exclusive use and handed back after the
+    command finishes, so a host that is targeted again shortly afterwards
+    (e.g. "Stop" right after "Start") skips the SSH handshake and password
+    authentication. Each entry remembers a digest of the password it was
+    opened with and is only reused for the same credentials.
+    """
+
+    def __init__(self, max_size=100, idle_timeout=300):
+        self.max_size = max_size
+        self.idle_timeout = idle_timeout
+        self.lock = threading.Lock()
+        self.idle = {}  # (host, user) -> [(connection, secret digest, last used)]
+        self.salt = os.urandom(16)
+        self.stats = {'hits': 0, 'misses': 0, 'evictions': 0, 'discarded': 0, 'connect_seconds': 0.0}
+        self.janitor = None
+
+    def configure(self, max_size, idle_timeout):
+        self.max_size = max_size
+        self.idle_timeout = idle_timeout
+        self.evict_idle()
+
+    def digest(self, password):
+        return hashlib.sha256(self.salt + (password or '').encode()).digest()
+
+    @staticmethod
+    def is_alive(conn):
+        """Cheap liveness check: the transport is up and accepts an SSH ignore packet."""
+        transport = conn.transport
+        if transport is None or not transport.is_active():
+            return False
+        try:
+            transport.send_ignore()
+        except Exception:
+            return False
+        return True
+
+    def close(self, conn):
+        try:
+            conn.close()
+        except Exception:
+            pass
+
+    def acquire(self, host, user, password, connect_timeout=None):
+        """Return an open connection to host, reusing an idle one when possible.
+
+        ``connect_timeout`` bounds the TCP connect, the SSH banner and the
+        authentication of a new connection, each separately.
+        """
+        key, digest = (host, user), self.digest(password)
+        while True:
+            with self.lock:
+                entries = self.idle.get(key, [])
+                matches = [i for i, entry in enumerate(entries) if entry[1] == digest]
+                if not matches:
+                    break
+                conn, _, last_used = entries.pop(matches[-1])
+                if not entries:
+                    del self.idle[key]
+            if time.monotonic() - last_used < self.idle_timeout and self.is_alive(conn):
+                with self.lock:
+                    self.stats['hits'] += 1
+                return conn
+            self.close(conn)
+            with self.lock:
+                self.stats['evictions'] += 1
+
+        conn = Connection(host, user=user, connect_timeout=connect_timeout,
+                          connect_kwargs={"password": password, "look_for_keys": False, "allow_agent": False,
+                                          "banner_timeout": connect_timeout, "auth_timeout": connect_timeout})
+        conn.config.runners.remote = CappedRemote
+        start = time.monotonic()
+        conn.open()
+        with self.lock:
+            self.stats['misses'] += 1
+            self.stats['connect_seconds'] += time.monotonic() - start
+        conn.pool_key, conn.pool_digest = key, digest
+        return conn
+
+    def release(self, conn, reusable=True):
+        """Return a connection to the pool, or close it if it must not be reused."""
+        if not reusable or self.max_size <= 0 or not self.is_alive(conn):
+            self.close(conn)
+            with self.lock:
+                self.stats['discarded'] += 1
+            return
+        evicted = []
+        with self.lock:
+            self.idle.setdefault(conn.pool_key, []).append((conn, conn.pool_digest, time.monotonic()))
+            # Over capacity: drop the least recently used idle connections
+            while sum(len(entries) for entries in self.idle.values()) > self.max_size:
+                key = min(self.idle, key=lambda k: self.idle[k][0][2])
+                evicted.append(self.idle[key].pop(0)[0])
+                if not self.idle[key]:
+                    del self.idle[key]
+            self.stats['evictions'] += len(evicted)
+            if self.janitor is None:
+                self.janitor = threading.Thread(target=self.run_janitor, name='ssh-pool-janitor', daemon=True)
+                self.janitor.start()
+        for stale in evicted:
+            self.close(stale)
+
+    def evict_idle(self):
+        """Close connections that have been idle for longer than the idle timeout."""
+        now = time.monotonic()
+        evicted = []
+        with self.lock:
+            for key in list(self.idle):
+                keep = []
+                for entry in self.idle[key]:
+                    (evicted if now - entry[2] >= self.idle_timeout else keep).append(entry)
+                if keep:
+                    self.idle[key] = keep
+                else:
+                    del self.idle[key]
+            self.stats['evictions'] += len(evicted)
+        for conn, _, _ in evicted:
+            self.close(conn)
+
+    def run_janitor(self):
+        while True:
+            time.sleep(min(30, max(1, self.idle_timeout / 2)))
+            self.evict_idle()
+
+    def snapshot(self):
+        """Pool statistics, including an estimate of the handshake time saved by reuse."""
+        with self.lock:
+            stats = dict(self.stats)
+            stats['idle_connections'] = sum(len(entries) for entries in self.idle.values())
+            stats['idle_hosts'] = len(self.idle)
+        avg_connect = stats['connect_seconds'] / stats['misses'] if stats['misses'] else 0.0
+        stats.update({
+            'max_size': self.max_size,
+            'idle_timeout': self.idle_timeout,
+            'avg_connect_seconds': round(avg_connect, 3),
+            'estimated_saved_seconds': round(avg_connect * stats['hits'], 2),
+            'connect_seconds': round(stats['connect_seconds'], 2),
+            'worker_pid': os.getpid()
+        })
+        return stats
+
+SSH_POOL = SSHConnectionPool(CONFIG['ssh_pool_size'], CONFIG['ssh_pool_idle_timeout'])
+
+# --- Output spool ---
+# Per-host command output is written to a file under OUTPUT_SPOOL_DIR while
+# it arrives; only the first output_preview_bytes are kept in memory and
+# rendered on the page. The full output is served by /api/output in pages.
+OUTPUT_SPOOL_DIR = os.environ.get('FSC_SPOOL_DIR', 'spool')
+OUTPUT_RETENTION_SECONDS = 24 * 3600
+OUTPUT_PAGE_MAX_BYTES = 1024 * 1024
+OUTPUT_RUN_ID_PATTERN = re.compile(r'^[0-9a-f]{12}$')
+
+class SpoolFile:
+    """File-like sink for one host's output: spools to disk, keeps a bounded preview."""
+
+    def __init__(self, path, preview_bytes):
+        self.path = path
+        self.preview_bytes = preview_bytes
+        self.file = open(path, 'wb')
+        self.head = bytearray()
+        self.size = 0
+
+    def write(self, data):
+        chunk = data.encode('utf-8', errors='replace')
+        self.file.write(chunk)
+        self.size += len(chunk)
+        if len(self.head) < self.preview_bytes:
+            self.head += chunk[:self.preview_bytes - len(self.head)]
+
+    def flush(self):
+        self.file.flush()
+
+    def close(self):
+        self.file.close()
+
+    @property
+    def truncated(self):
+        return self.size > len(self.head)
+
+    def preview(self):
+        # The cut may fall inside a multi-byte character; drop the fragment
+        return self.head.decode('utf-8', errors='ignore').strip()
+
+class TeeStream:
+    """Write remote output to several sinks, e.g. a spool file and a live stream."""
+
+    def __init__(self, *streams):
+        self.streams = streams
+
+    def write(self, data):
+        for stream in self.streams:
+            stream.write(data)
+
+    def flush(self):
+        for stream in self.streams:
+            stream.flush()
+
+def create_output_run():
+    """Create a spool directory for a new run and return its ID."""
+    run_id = uuid.uuid4().hex[:12]
+    os.makedirs(os.path.join(OUTPUT_SPOOL_DIR, run_id))
+    # Drop old runs so the spool does not grow without bound
+    expired = time.time() - OUTPUT_RETENTION_SECONDS
+    for name in os.listdir(OUTPUT_SPOOL_DIR):
+        path = os.path.join(OUTPUT_SPOOL_DIR, name)
+        try:
+            if OUTPUT_RUN_ID_PATTERN.match(name) and os.stat(path).st_mtime < expired:
+                shutil.rmtree(path, ignore_errors=True)
+        except OSError:
+            pass
+    return run_id
+
+def output_spool_path(run_id, position):
+    return os.path.join(OUTPUT_SPOOL_DIR, run_id, f'{position}.out')
+
+def write_output_manifest(run_id, command_string, host_results):
+    """Record which host each spool file belongs to, for /api/output/<run_id>."""
+    manifest = {
+        'run_id': run_id,
+        'command': command_string,
+        'created_at': time.time(),
+        'hosts': [{'position': position, 'host': r['host'], 'status': r['status'],
+                   'size': r.get('output_size', 0), 'truncated': r.get('truncated', False)}
+                  for position, r in enumerate(host_results)]
+    }
+    path = os.path.join(OUTPUT_SPOOL_DIR, run_id, 'manifest.json')
+    with open(path + '.tmp', 'w') as f:
+        json.dump(manifest, f)
+    os.replace(path + '.tmp', path)
+
+def read_output_manifest(run_id):
+    """Return the manifest of a spooled run, or None if it does not exist (anymore)."""
+    if not OUTPUT_RUN_ID_PATTERN.match(run_id):
+        return None
+    try:
+        with open(os.path.join(OUTPUT_SPOOL_DIR, run_id, 'manifest.json'), 'r') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+# --- Core function for SSH commands ---
+# Deadlines and retries per command; each can be set on a command in
+# commands.json and defaults to the _config value of the same name.
+RUN_LIMIT_DEFAULTS = {
+    'connect_timeout': 10,    # seconds for TCP connect, SSH banner and authentication
+    'command_timeout': 0,     # seconds a command may run on one host, 0 = no limit
+    'connect_retries': 2,     # extra connect attempts after a transient failure
+    'retry_backoff': 1.0,     # base delay in seconds, doubled per attempt and jittered
+    'run_budget': 900         # seconds for a page or streamed run across all hosts, 0 = no limit
+}
+RETRY_MAX_BACKOFF = 30.0
+DISCONNECT_TIMEOUT = 10  # a command that drops the connection counts as started after this long
+
+def get_run_limits(command_info):
+    """Resolve the SSH deadlines and retries for a command (command settings win over _config)."""
+    limits = {}
+    for key, default in RUN_LIMIT_DEFAULTS.items():
+        try:
+            value = float(command_info.get(key, CONFIG.get(key, default)))
+        except (TypeError, ValueError):
+            value = default
+        limits[key] = max(0.0, value)
+    limits['connect_timeout'] = max(1.0, limits['connect_timeout'])
+    limits['connect_retries'] = int(limits['connect_retries'])
+    return limits
+
+def run_deadline(command_info, background=False):
+    """Monotonic time at which a run of this command must stop, or None without a budget.
+
+    Background jobs (and pre-warm runs, which are jobs) exist for long runs
+    such as a fabric install, so the _config budget does not apply to them;
+    only a run_budget set on the command itself does.
+    """
+    if background and command_info.get('run_budget') is None:
+        return None
+    budget = get_run_limits(command_info)['run_budget']
+    return time.monotonic() + budget if budget else None
+
+def is_transient_connect_error(error):
+    """Connect failures worth retrying: timeouts, refused/reset connections and SSH handshake errors.
+
+    Failed authentication and unknown host names are not retried.
+    """
+    if isinstance(error, (AuthenticationException, socket.gaierror)):
+        return False
+    return isinstance(error, (OSError, SSHException))
+
+def connect_with_retries(host, username, password, limits, deadline, command_name):
+    """Get a connection from the pool, retrying transient failures with jittered exponential backoff.
+
+    Returns (connection, attempts). The last error is raised when the retries
+    are used up or the next attempt would start after the deadline.
+    """
+    attempt = 0
+    while True:
+        attempt += 1
+        connect_timeout = limits['connect_timeout']
+        if deadline is not None:
+            connect_timeout = min(connect_timeout, max(0.1, deadline - time.monotonic()))
+        try:
+            return SSH_POOL.acquire(host, username, password, connect_timeout), attempt
+        except Exception as e:
+            if attempt > limits['connect_retries'] or not is_transient_connect_error(e):
+                e.attempts = attempt
+                raise
+            backoff = min(RETRY_MAX_BACKOFF, limits['retry_backoff'] * 2 ** (attempt - 1))
+            # Jitter spreads out the retries of hosts that failed at the same moment
+            delay = backoff / 2 + random.uniform(0, backoff / 2)
+            if deadline is not None and time.monotonic() + delay >= deadline:
+                e.attempts = attempt
+                raise
+            SSH_CONNECT_RETRIES.labels(command_name).inc()
+            log_event('warning', 'SSH connect failed, retrying',
+                     host=host,
+                     attempt=attempt,
+                     delay=f"{delay:.1f}s",
+                     error=str(e),
+                     error_type=type(e).__name__)
+            time.sleep(delay)
+
+def run_on_host(host, username, password, command_string, command_info, out_stream=None, deadline=None):
+    """Run a command on a single host and return its result as a dict.
+
+    Watchers are built per host because each responder keeps the output it
+    has not matched yet, so it cannot be shared between concurrently running
+    hosts. Only the first output_preview_bytes of stdout/stderr are returned
+    (see CappedRemote); when ``out_stream`` is given the whole remote output
+    is written to it while the command runs.
+
+    The status is 'ok', 'disconnected', 'error' or 'timed_out'. Connects and
+    commands are cut short at ``deadline`` (the end of the run budget), and a
+    host that is reached after it is not contacted at all.
+    """
+    host_result = {'host': host, 'status': 'ok', 'stdout': '', 'stderr': '', 'error': None, 'duration': 0.0,
+                   'attempts': 0}
+    watchers = command_info.watchers()
+    start = time.monotonic()
+    conn = None
+    reusable = not command_info.get('disconnect')
+    command_name = getattr(command_info, 'name', 'unknown')
+    limits = get_run_limits(command_info)
+    timeout, cut_by_budget = None, False
+    if deadline is not None and start >= deadline:
+        host_result.update(status='timed_out', error="Run budget used up before this host was started")
+        TIMEOUTS.labels('ssh').inc()
+        return host_result
+    SSH_IN_FLIGHT.inc()
+    try:
+        conn, host_result['attempts'] = connect_with_retries(host, username, password, limits, deadline, command_name)
+        SSH_CONNECT_DURATION.labels(command_name).observe(time.monotonic() - start)
+        timeout = DISCONNECT_TIMEOUT if command_info.get('disconnect') else limits['command_timeout'] or None
+        if deadline is not None and (timeout is None or deadline - time.monotonic() < timeout):
+            timeout, cut_by_budget = max(0.1, deadline - time.monotonic()), True
+        if command_info.get('disconnect'):
+            try:
+                result = conn.run(command_string, hide=out_stream is None, out_stream=out_stream, warn=True, pty=True, watchers=watchers, timeout=timeout)
+            except CommandTimedOut:
+                host_result['status'] = 'disconnected'
+                log_event('info', 'Command completed with disconnect',
+                         host=host,
+                         command=command_string)
+                return host_result
+        else:
+            result = conn.run(command_string, hide=out_stream is None, out_stream=out_stream, warn=True, pty=True, watchers=watchers, timeout=timeout)
+        host_result['stdout'], host_result['stderr'] = result.stdout.strip(), result.stderr.strip()
+        log_event('info', 'Command executed successfully',
+                 host=host,
+                 command=command_string,
+                 has_stdout=bool(host_result['stdout']),
+                 has_stderr=bool(host_result['stderr']))
+    except Exception as e:
+        reusable = False
+        host_result['attempts'] = getattr(e, 'attempts', host_result['attempts'])
+        if isinstance(e, CommandTimedOut):
+            host_result['status'] = 'timed_out'
+            host_result['error'] = ("Run budget used up while the command was running" if cut_by_budget
+                                    else f"Command did not finish within {timeout:g}s")
+            # The partial output captured so far is kept
+            host_result['stdout'], host_result['stderr'] = e.result.stdout.strip(), e.result.stderr.strip()
+        elif isinstance(e, TimeoutError) or isinstance(e.__context__, TimeoutError):
+            # paramiko reports a missing SSH banner as an SSHException raised from the timeout
+            host_result['status'] = 'timed_out'
+            host_result['error'] = f"Connect timed out after {host_result['attempts']} attempt(s)"
+        else:
+            host_result['status'] = 'error'
+            host_result['error'] = str(e) if host_result['attempts'] <= 1 else f"{e} (after {host_result['attempts']} attempts)"
+        (TIMEOUTS if host_result['status'] == 'timed_out' else ERRORS).labels('ssh').inc()
+        log_event('error', 'SSH command failed',
+                 host=host,
+                 command=command_string,
+                 status=host_result['status'],
+                 attempts=host_result['attempts'],
+                 error=str(e),
+                 error_type=type(e).__name__)
+    finally:
+        if conn is not None:
+            SSH_POOL.release(conn, reusable=reusable)
+        host_result['duration'] = time.monotonic() - start
+        SSH_IN_FLIGHT.dec()
+        SSH_COMMAND_DURATION.labels(command_name, host_result['status']).observe(host_result['duration'])
+    return host_result
+
+def summarize_statuses(host_results):
+    """Count host results as ok (including expected disconnects), failed and timed out."""
+    summary = {'ok': 0, 'failed': 0, 'timed_out': 0}
+    for host_result in host_results:
+        status = host_result['status']
+        if status in ('ok', 'disconnected'):
+            summary['ok'] += 1
+        elif status == 'timed_out':
+            summary['timed_out'] += 1
+        else:
+            summary['failed'] += 1
+    return summary
+
+def format_host_result(host_result, output_url=None):
+    """Render a single host result in the plain-text output format."""
+    header = "="*20 + f"\nHost: {host_result['host']} ({host_result['duration']:.1f}s)\n" + "="*20 + "\n"
+    return header + format_result_body(host_result, output_url)
+
+def format_result_body(host_result, output_url=None):
+    lines = []
+    if host_result['status'] == 'disconnected':
+        lines.append("✅ Command successfully started. Server rebooted, connection dropped as expected.\n\n")
+    elif host_result['status'] == 'error':
+        lines.append(f"❌ Error on {host_result['host']}: {host_result['error']}\n\n")
+    else:
+        if host_result['status'] == 'timed_out':
+            lines.append(f"⏱️ Timed out on {host_result['host']}: {host_result['error']}\n\n")
+            if not host_result['stdout'] and not host_result['stderr']:
+                return "".join(lines)
+        if host_result['stdout']: lines.append(f"Output:\n{host_result['stdout']}\n\n")
+        if host_result.get('truncated'):
+            lines.append(f"[Output truncated, {host_result['output_size']} bytes in total"
+                         + (f", full output: {output_url}" if output_url else "") + "]\n\n")
+        if host_result['stderr']: lines.append(f"Errors:\n{host_result['stderr']}\n\n")
+        if not host_result['stdout'] and not host_result['stderr']: lines.append("No output received.\n\n")
+    return "".join(lines)
+
+# --- Output grouping ---
+# In compact mode hosts whose output is the same after normalization are
+# shown as one block with the list of hosts, and other outcomes as a diff
+# against the most common one, so the result grows with the number of
+# distinct outcomes instead of the number of hosts.
+OUTPUT_ANSI_ESCAPE = re.compile(r'\x1b(\[[0-9;?]*[ -/]*[@-~]|[@-Z\\-_])')
+OUTPUT_DIFF_MAX_LINES = 200
+
+def normalize_output_lines(lines, host):
+    """Lines as a terminal would show them, with the host's own address replaced.
+
+    Colour codes, text overwritten with a carriage return (progress bars),
+    trailing spaces and leading/trailing blank lines are dropped, so
+    outputs that only differ in those respects compare equal.
+    """
+    address = host.rsplit(':', 1)[0] if host.count(':') == 1 else host
+    blank = 0
+    started = False
+    for line in lines:
+        line = OUTPUT_ANSI_ESCAPE.sub('', line.rstrip('\r\n')).rstrip('\r').split('\r')[-1].rstrip()
+        if address:
+            line = line.replace(address, '<host>')
+        if not line:
+            blank += started
+            continue
+        yield from [''] * blank
+        blank, started = 0, True
+        yield line
+
+def spool_lines(path):
+    """Lines of a spooled output file, read one at a time."""
+    with open(path, 'rb') as f:
+        for line in f:
+            yield line.decode('utf-8', errors='replace')
+
+class OutputGrouper:
+    """Groups host results by a hash of their normalized outcome.
+
+    Only the first result of each group is kept; further hosts with the same
+    outcome just add their name and duration. ``stdout_lines`` lets callers
+    hash the full output (e.g. a spool file) rather than the preview.
+    """
+
+    def __init__(self):
+        self.groups = {}
+
+    def add(self, host_result, stdout_lines=None, output_url=None):
+        host, status = host_result['host'], host_result['status']
+        digest = hashlib.sha256(status.encode())
+        if status == 'error':
+            digest.update('\n'.join(normalize_output_lines([host_result['error'] or ''], host)).encode())
+        elif status != 'disconnected':
+            for line in normalize_output_lines(stdout_lines if stdout_lines is not None
+                                               else host_result['stdout'].split('\n'), host):
+                digest.update(line.encode() + b'\n')
+            digest.update(b'\0')
+            for line in normalize_output_lines(host_result['stderr'].split('\n'), host):
+                digest.update(line.encode() + b'\n')
+        key = digest.hexdigest()[:16]
+        group = self.groups.get(key)
+        if group is None:
+            group = self.groups[key] = {'digest': key, 'result': host_result, 'output_url': output_url,
+                                        'hosts': [], 'durations': []}
+        group['hosts'].append(host)
+        group['durations'].append(host_result.get('duration') or 0.0)
+        return group
+
+    @staticmethod
+    def preview_lines(group):
+        result = group['result']
+        text = result['error'] if result['status'] == 'error' else '\n'.join(
+            filter(None, [result['stdout'], result['stderr'] and f"Errors:\n{result['stderr']}"]))
+        return list(normalize_output_lines((text or '').split('\n'), result['host']))
+
+    def ordered(self):
+        """Groups, most common outcome first, each outlier with a diff against it."""
+        groups = sorted(self.groups.values(), key=lambda g: -len(g['hosts']))
+        if not groups:
+            return groups
+        majority = self.preview_lines(groups[0])
+        for group in groups[1:]:
+            # Different statuses are clearer shown as they are than as a diff
+            if group['result']['status'] != groups[0]['result']['status'] or group['result']['status'] == 'disconnected':
+                continue
+            diff = list(itertools.islice(difflib.unified_diff(
+                majority, self.preview_lines(group), 'most common output', f"{len(group['hosts'])} host(s)",
+                n=1, lineterm=''), OUTPUT_DIFF_MAX_LINES + 1))
+            if len(diff) > OUTPUT_DIFF_MAX_LINES:
+                diff[OUTPUT_DIFF_MAX_LINES:] = ['[diff truncated]']
+            group['diff'] = diff
+        return groups
+
+    def as_json(self):
+        return [{
+            'digest': group['digest'],
+            'count': len(group['hosts']),
+            'hosts': group['hosts'],
+            'status': group['result']['status'],
+            'stdout': group['result']['stdout'],
+            'stderr': group['result']['stderr'],
+            'error': group['result']['error'],
+            'diff': group.get('diff'),
+            'output_url': group['output_url'],
+            'duration_min': min(group['durations']),
+            'duration_max': max(group['durations'])
+        } for group in self.ordered()]
+
+def format_grouped_results(groups):
+    """Render grouped host results in the plain-text output format."""
+    lines = []
+    for number, group in enumerate(groups, 1):
+        count = len(group['hosts'])
+        lines.append("="*20 + f"\nOutcome {number} of {len(groups)}: {count} host(s)"
+                     f" ({min(group['durations']):.1f}-{max(group['durations']):.1f}s)\n"
+                     f"Hosts: {', '.join(group['hosts'])}\n" + "="*20 + "\n")
+        if group.get('diff'):
+            lines.append("Difference from the most common output:\n" + "\n".join(group['diff']) + "\n\n")
+        else:
+            lines.append(format_result_body(group['result'], group['output_url']))
+    return "".join(lines)
+
+def get_max_concurrency(command_info):
+    """Resolve the SSH fan-out limit for a command (command setting wins over _config)."""
+    try:
+        limit = int(command_info.get('max_concurrency', CONFIG.get('max_concurrency', 10)))
+    except (TypeError, ValueError):
+        limit = 10
+    return max(1, limit)
+
+def execute_remote_command(hosts, username, password, command_string, compact=False):
+    """Run a command on all hosts; returns the text output and links to truncated outputs.
+
+    Each host's output is spooled to disk as it arrives and only a preview
+    is kept in memory, so the page stays small however much the hosts print.
+    With ``compact`` hosts with identical output are listed as one block.
+    """
+    output_buffer = io.StringIO()
+    output_files = []
+    selected_command_info = find_command_info(command_string)
+    if not selected_command_info:
+        error_msg = f"❌ Error: The selected command '{command_string}' could not be found."
+        output_buffer.write(error_msg)
+        log_event('error', 'Command not found',
+                 command=command_string,
+                 remote_addr=request.remote_addr)
+        return output_buffer.getvalue(), output_files
     
-    log_event('info', 'Starting VMs',
-             vm_count=len(vms_to_start),
-             vm_names=[vm['name'] for vm in vms_to_start],
+    max_concurrency = get_max_concurrency(selected_command_info)
+    preview_bytes = CONFIG['output_preview_bytes']
+    run_budget = get_run_limits(selected_command_info)['run_budget']
+    log_event('info', 'Executing SSH command',
+             command=command_string,
+             host_count=len(hosts),
+             username=username,
+             max_concurrency=max_concurrency,
+             run_budget=run_budget,
              remote_addr=request.remote_addr)
     
-    errors = []
-    for vm in vms_to_start:
+    def run_spooled(position, host):
+        spool = SpoolFile(output_spool_path(run_id, position), preview_bytes)
         try:
-            # Use --async to send commands quickly one after another
-            gcloud_command = ['gcloud', 'compute', 'instances', 'start', vm['name'], f'--zone={vm["zone"]}', '--async']
-            subprocess.run(gcloud_command, capture_output=True, text=True, check=True, timeout=60)
-        except Exception as e:
-            error_msg = f"Could not start VM {vm['name']}: {str(e)}"
-            errors.append(error_msg)
-            log_event('error', 'Failed to start VM',
-                     vm_name=vm['name'],
-                     zone=vm['zone'],
-                     error=str(e),
-                     remote_addr=request.remote_addr)
+            host_result = run_on_host(host, username, password, command_string, selected_command_info,
+                                      out_stream=spool, deadline=deadline)
+        finally:
+            spool.close()
+        # The spool's preview is cut at a byte limit, like the size it reports
+        host_result.update(stdout=spool.preview(), output_size=spool.size, truncated=spool.truncated)
+        return host_result
+    
+    run_start = time.monotonic()
+    deadline = run_deadline(selected_command_info)
+    run_id = None
+    host_results = []
+    grouper = OutputGrouper() if compact else None
+    try:
+        output_buffer.write(f"▶️ Executing command: '{command_string}'\n\n--- RESULTS ---\n")
+        run_id = create_output_run()
+        # executor.map yields results in the order the hosts were given,
+        # regardless of which host finishes first.
+        with ThreadPoolExecutor(max_workers=min(max_concurrency, len(hosts)) or 1) as executor:
+            results = executor.map(run_spooled, range(len(hosts)), hosts)
+            for position, host_result in enumerate(results):
+                host_results.append({key: host_result[key] for key in ('host', 'status', 'output_size', 'truncated')})
+                output_url = f'/api/output/{run_id}/{position}' if host_result['truncated'] else None
+                if grouper is not None:
+                    # Hash the whole spooled output, not just the preview
+                    group = grouper.add(host_result, spool_lines(output_spool_path(run_id, position)), output_url)
+                    if output_url and group['result'] is host_result:
+                        output_files.append({'host': host_result['host'], 'size': host_result['output_size'],
+                                             'url': output_url})
+                    continue
+                if output_url:
+                    output_files.append({'host': host_result['host'], 'size': host_result['output_size'],
+                                         'url': output_url})
+                output_buffer.write(format_host_result(host_result, output_url))
+        if grouper is not None:
+            groups = grouper.ordered()
+            output_buffer.write(f"{len(hosts)} host(s), {len(groups)} distinct outcome(s)\n")
+            output_buffer.write(format_grouped_results(groups))
+    except Exception as e:
+        error_msg = f"\n❌ General error:\nType: {type(e).__name__}\nDetails: {e}\n"
+        output_buffer.write(error_msg)
+        log_event('error', 'SSH execution failed',
+                 command=command_string,
+                 error=str(e),
+                 error_type=type(e).__name__,
+                 remote_addr=request.remote_addr)
+    
+    if run_id is not None:
+        try:
+            write_output_manifest(run_id, command_string, host_results)
+        except OSError as e:
+            log_event('warning', 'Could not write output manifest', run_id=run_id, error=str(e))
+    
+    elapsed = time.monotonic() - run_start
+    summary = summarize_statuses(host_results)
+    output_buffer.write(f"--- Completed {len(hosts)} host(s) in {elapsed:.1f}s (max concurrency: {max_concurrency}): "
+                        f"{summary['ok']} ok, {summary['failed']} failed, {summary['timed_out']} timed out ---\n")
+    if deadline is not None and time.monotonic() >= deadline and summary['timed_out']:
+        output_buffer.write(f"⏱️ The run budget of {run_budget:g}s was used up; results are partial.\n")
+    log_event('info', 'SSH command run finished',
+             command=command_string,
+             host_count=len(hosts),
+             run_id=run_id,
+             duration=f"{elapsed:.2f}s",
+             **summary,
+             remote_addr=request.remote_addr)
+    return output_buffer.getvalue(), output_files
+
+# --- Streaming command output ---
+STREAM_QUEUE_SIZE = 500        # max pending events per run (backpressure on the SSH threads)
+STREAM_MAX_LINE_LENGTH = 2000  # longer lines are truncated before they are queued
+STREAM_KEEPALIVE_SECONDS = 15
+
+def format_sse(event, data):
+    """Format a single Server-Sent Event."""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+class HostLineStream:
+    """File-like object that turns remote output into per-line stream events.
+
+    Only one partial line is buffered per host, and events go into a bounded
+    queue, so memory per run stays bounded however much a host prints. When
+    the queue is full the writing SSH thread waits for the client to catch up.
+    Like the page's other previews, only the first output_preview_bytes are
+    sent; after that one 'truncated' event points to the full output.
+    """
+
+    def __init__(self, events, index, host, cancelled, output_url=None):
+        self.events = events
+        self.index = index
+        self.host = host
+        self.cancelled = cancelled
+        self.output_url = output_url
+        self.partial = ''
+        self.remaining = CONFIG['output_preview_bytes']
+        self.truncated = False
+
+    def put(self, event, data):
+        while not self.cancelled.is_set():
+            try:
+                self.events.put((event, data), timeout=1)
+                return
+            except queue.Full:
+                continue
 
-    if errors:
-        return jsonify({'error': '. '.join(errors)}), 500
+    def emit(self, line):
+        if self.truncated:
+            return
+        if len(line) >= self.remaining:
+            self.truncated = True
+            self.partial = ''
+            self.put('truncated', {'index': self.index, 'host': self.host, 'output_url': self.output_url})
+            return
+        self.remaining -= len(line) + 1
+        if len(line) > STREAM_MAX_LINE_LENGTH:
+            line = line[:STREAM_MAX_LINE_LENGTH] + ' [line truncated]'
+        self.put('line', {'index': self.index, 'host': self.host, 'line': line})
 
-    log_event('info', 'VMs start commands sent successfully',
-             vm_count=len(vms_to_start),
-             remote_addr=request.remote_addr)
-    
-    return jsonify({'success': f'Start command for {len(vms_to_start)} VM(s) sent.'})
+    def write(self, data):
+        if self.truncated:
+            return
+        self.partial += data.replace('\r\n', '\n').replace('\r', '\n')
+        *lines, self.partial = self.partial.split('\n')
+        for line in lines:
+            self.emit(line)
+        if len(self.partial) > STREAM_MAX_LINE_LENGTH:
+            self.emit(self.partial)
+            self.partial = ''
 
+    def flush(self):
+        pass
 
-# --- Core function for SSH commands ---
-def execute_remote_command(hosts, username, password, command_string):
-    output_buffer = io.StringIO()
-    selected_command_info = None
-    for key, info in COMMAND_OPTIONS.items():
-        if not key.startswith('_') and isinstance(info, dict) and 'command' in info:
-            if command_string.startswith(info['command'].split('{')[0]):
-                selected_command_info = info
-                break
-    if not selected_command_info:
-        error_msg = f"❌ Error: The selected command '{command_string}' could not be found."
-        output_buffer.write(error_msg)
-        log_event('error', 'Command not found',
-                 command=command_string,
-                 remote_addr=request.remote_addr)
-        return output_buffer.getvalue()
-    
-    log_event('info', 'Executing SSH command',
+    def close(self):
+        if self.partial:
+            self.emit(self.partial)
+            self.partial = ''
+
+def stream_remote_command(hosts, username, password, command_string, command_info, remote_addr):
+    """Run a command on all hosts and yield Server-Sent Events as output arrives."""
+    max_concurrency = get_max_concurrency(command_info)
+    events = queue.Queue(maxsize=STREAM_QUEUE_SIZE)
+    cancelled = threading.Event()
+
+    def run_host(index, host):
+        stream = HostLineStream(events, index, host, cancelled, f'/api/output/{run_id}/{index}')
+        host_result = {'host': host, 'status': 'cancelled', 'error': None, 'duration': 0.0}
+        output_url = None
+        try:
+            if not cancelled.is_set():
+                stream.put('host_start', {'index': index, 'host': host})
+                # The full output goes to the spool too, so it can be read back after the run
+                spool = SpoolFile(output_spool_path(run_id, index), CONFIG['output_preview_bytes'])
+                try:
+                    host_result = run_on_host(host, username, password, command_string, command_info,
+                                              out_stream=TeeStream(spool, stream), deadline=deadline)
+                finally:
+                    spool.close()
+                stream.close()
+                host_result.update(output_size=spool.size, truncated=spool.truncated)
+                output_url = f'/api/output/{run_id}/{index}'
+        finally:
+            host_results[index] = host_result
+            stream.put('host_done', {
+                'index': index,
+                'host': host,
+                'status': host_result['status'],
+                'error': host_result['error'],
+                'duration': round(host_result['duration'], 2),
+                'output_url': output_url
+            })
+
+    log_event('info', 'Streaming SSH command',
              command=command_string,
              host_count=len(hosts),
              username=username,
-             remote_addr=request.remote_addr)
-    
-    watchers = []
-    if selected_command_info.get('responses'):
-        for pattern, response in selected_command_info['responses'].items():
-            watchers.append(Responder(pattern=pattern, response=response))
+             max_concurrency=max_concurrency,
+             remote_addr=remote_addr)
+
+    run_start = time.monotonic()
+    deadline = run_deadline(command_info)
+    run_id = create_output_run()
+    host_results = [{'host': host, 'status': 'pending'} for host in hosts]
+    # Written up front so a host's output can be paged while it is still running
+    write_output_manifest(run_id, command_string, host_results)
+    executor = ThreadPoolExecutor(max_workers=min(max_concurrency, len(hosts)))
+    for index, host in enumerate(hosts):
+        executor.submit(run_host, index, host)
+    executor.shutdown(wait=False)
+
+    statuses = {}
     try:
-        group = Group(*hosts, user=username, connect_kwargs={"password": password, "look_for_keys": False, "allow_agent": False})
-        output_buffer.write(f"▶️ Executing command: '{command_string}'\n\n--- RESULTS ---\n")
-        for conn in group:
-            output_buffer.write("="*20 + f"\nHost: {conn.host}\n" + "="*20 + "\n")
+        yield format_sse('start', {'command': command_string, 'hosts': hosts, 'max_concurrency': max_concurrency,
+                                   'output_run_id': run_id})
+        while len(statuses) < len(hosts):
             try:
-                if selected_command_info.get('disconnect'):
+                event, data = events.get(timeout=STREAM_KEEPALIVE_SECONDS)
+            except queue.Empty:
+                yield ': keepalive\n\n'
+                continue
+            if event == 'host_done':
+                statuses[data['index']] = data['status']
+            yield format_sse(event, data)
+        elapsed = time.monotonic() - run_start
+        summary = summarize_statuses({'status': status} for status in statuses.values())
+        yield format_sse('done', {
+            'host_count': len(hosts),
+            **summary,
+            'duration': round(elapsed, 2),
+            'max_concurrency': max_concurrency
+        })
+        log_event('info', 'SSH command stream finished',
+                 command=command_string,
+                 host_count=len(hosts),
+                 duration=f"{elapsed:.2f}s",
+                 remote_addr=remote_addr)
+    finally:
+        # Runs on normal completion and when the client disconnects; hosts that
+        # have not started yet are skipped and blocked writers are released.
+        if len(statuses) < len(hosts):
+            log_event('warning', 'SSH command stream closed early',
+                     command=command_string,
+                     completed=len(statuses),
+                     host_count=len(hosts),
+                     remote_addr=remote_addr)
+        cancelled.set()
+        try:
+            write_output_manifest(run_id, command_string, host_results)
+        except OSError as e:
+            log_event('warning', 'Could not write output manifest', run_id=run_id, error=str(e))
+
+# --- Background jobs ---
+# Job state lives in SQLite so every gunicorn worker can answer status
+# queries, while the work itself runs on the executor of the worker that
+# accepted the submission.
+JOB_WORKERS = int(os.environ.get('FSC_JOB_WORKERS', 4))
+JOB_RETENTION_SECONDS = 7 * 24 * 3600
+JOB_EXECUTOR = ThreadPoolExecutor(max_workers=JOB_WORKERS, thread_name_prefix='job')
+
+def create_job(hosts, username, command_string, remote_addr):
+    """Register a new job and its hosts, returning the job ID."""
+    job_id = uuid.uuid4().hex[:12]
+    now = time.time()
+    with state_db() as db:
+        db.execute('INSERT INTO jobs (id, command, status, host_count, username, remote_addr, worker_pid, created_at) '
+                   'VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+                   (job_id, command_string, 'queued', len(hosts), username, remote_addr, os.getpid(), now))
+        db.executemany('INSERT INTO job_hosts (job_id, position, host, status) VALUES (?, ?, ?, ?)',
+                       [(job_id, position, host, 'pending') for position, host in enumerate(hosts)])
+        # Drop old jobs so the database does not grow without bound
+        expired = now - JOB_RETENTION_SECONDS
+        db.execute('DELETE FROM job_hosts WHERE job_id IN (SELECT id FROM jobs WHERE created_at < ?)', (expired,))
+        db.execute('DELETE FROM jobs WHERE created_at < ?', (expired,))
+    return job_id
+
+def job_cancel_requested(job_id):
+    with state_db() as db:
+        row = db.execute('SELECT cancel_requested FROM jobs WHERE id = ?', (job_id,)).fetchone()
+    return bool(row and row['cancel_requested'])
+
+def run_job(job_id, hosts, username, password, command_string, command_info):
+    """Execute a job on the background executor and record per-host results."""
+    run_id = None
+    deadline = run_deadline(command_info, background=True)
+    host_results = [{'host': host, 'status': 'cancelled'} for host in hosts]
+
+    def run_host(position, host):
+        if job_cancel_requested(job_id):
+            with state_db() as db:
+                db.execute("UPDATE job_hosts SET status = 'cancelled' WHERE job_id = ? AND position = ?", (job_id, position))
+            return
+        with state_db() as db:
+            db.execute("UPDATE job_hosts SET status = 'running' WHERE job_id = ? AND position = ?", (job_id, position))
+        # Only the preview goes into the database; the full output stays in the spool
+        spool = SpoolFile(output_spool_path(run_id, position), CONFIG['output_preview_bytes'])
+        try:
+            host_result = run_on_host(host, username, password, command_string, command_info,
+                                      out_stream=spool, deadline=deadline)
+        finally:
+            spool.close()
+        host_result.update(stdout=spool.preview(), output_size=spool.size, truncated=spool.truncated)
+        host_results[position] = host_result
+        with state_db() as db:
+            db.execute('UPDATE job_hosts SET status = ?, stdout = ?, stderr = ?, error = ?, duration = ?, '
+                       'output_url = ?, output_size = ?, truncated = ? WHERE job_id = ? AND position = ?',
+                       (host_result['status'], host_result['stdout'], host_result['stderr'],
+                        host_result['error'], host_result['duration'], f'/api/output/{run_id}/{position}',
+                        spool.size, int(spool.truncated), job_id, position))
+
+    JOBS_IN_FLIGHT.inc()
+    try:
+        # Inside the try so a spool or database error still ends the job
+        run_id = create_output_run()
+        write_output_manifest(run_id, command_string, [{'host': host, 'status': 'pending'} for host in hosts])
+        with state_db() as db:
+            db.execute("UPDATE jobs SET status = 'running', started_at = ?, output_run_id = ? WHERE id = ?",
+                       (time.time(), run_id, job_id))
+        with ThreadPoolExecutor(max_workers=min(get_max_concurrency(command_info), len(hosts))) as executor:
+            list(executor.map(run_host, range(len(hosts)), hosts))
+        status = 'cancelled' if job_cancel_requested(job_id) else 'completed'
+    except Exception as e:
+        status = 'failed'
+        log_event('error', 'Background job failed',
+                 job_id=job_id,
+                 error=str(e),
+                 error_type=type(e).__name__)
+    finally:
+        JOBS_IN_FLIGHT.dec()
+    if run_id is not None:
+        try:
+            write_output_manifest(run_id, command_string, host_results)
+        except OSError as e:
+            log_event('warning', 'Could not write output manifest', run_id=run_id, error=str(e))
+    with state_db() as db:
+        db.execute('UPDATE jobs SET status = ?, finished_at = ? WHERE id = ?', (status, time.time(), job_id))
+        db.execute("UPDATE job_hosts SET status = 'cancelled' WHERE job_id = ? AND status IN ('pending', 'running')",
+                   (job_id,))
+    log_event('info', 'Background job finished',
+             job_id=job_id,
+             status=status,
+             command=command_string,
+             host_count=len(hosts))
+
+def worker_alive(pid):
+    """Check whether the worker process that owns a job is still running."""
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+def get_job(job_id):
+    """Return a job with per-status host counts, or None if it does not exist."""
+    with state_db() as db:
+        job = db.execute('SELECT * FROM jobs WHERE id = ?', (job_id,)).fetchone()
+        if not job:
+            return None
+        job = dict(job)
+        # A job whose worker died (restart, crash) will never finish on its own
+        if job['status'] in ('queued', 'running') and job['worker_pid'] and not worker_alive(job['worker_pid']):
+            job['status'] = 'interrupted'
+            db.execute("UPDATE jobs SET status = 'interrupted', finished_at = ? WHERE id = ?", (time.time(), job_id))
+            db.execute("UPDATE job_hosts SET status = 'interrupted' WHERE job_id = ? AND status IN ('pending', 'running')", (job_id,))
+        counts = db.execute('SELECT status, COUNT(*) AS n FROM job_hosts WHERE job_id = ? GROUP BY status', (job_id,)).fetchall()
+    job['hosts'] = {row['status']: row['n'] for row in counts}
+    job.pop('cancel_requested', None)
+    return job
+
+# --- Start-to-command workflows ---
+# A workflow takes VMs from stopped to "command has run" without waiting for
+# the slowest one: after one batched start, every VM goes through its own
+# stages (running, ip, ssh, execute) in its own thread. State is stored like
+# jobs, so any worker can report progress and per-stage timings.
+WORKFLOW_STAGES = ('start', 'running', 'ip', 'ssh', 'execute')
+WORKFLOW_POLL_SECONDS = 5
+WORKFLOW_MAX_THREADS = 200
+# A workflow can take twenty minutes or more (boot, SSH, command), so it gets
+# its own executor instead of holding slots of the background job executor
+WORKFLOW_WORKERS = int(os.environ.get('FSC_WORKFLOW_WORKERS', 4))
+WORKFLOW_EXECUTOR = ThreadPoolExecutor(max_workers=WORKFLOW_WORKERS, thread_name_prefix='workflow-run')
+
+def create_workflow(vms, username, command_string, remote_addr):
+    """Register a new workflow and its VMs, returning the workflow ID."""
+    workflow_id = uuid.uuid4().hex[:12]
+    now = time.time()
+    with state_db() as db:
+        db.execute('INSERT INTO workflows (id, command, status, vm_count, username, remote_addr, worker_pid, created_at) '
+                   'VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+                   (workflow_id, command_string, 'queued', len(vms), username, remote_addr, os.getpid(), now))
+        db.executemany("INSERT INTO workflow_vms (workflow_id, position, name, zone, stage, status, stages) "
+                       "VALUES (?, ?, ?, ?, 'start', 'pending', '{}')",
+                       [(workflow_id, position, vm['name'], vm['zone']) for position, vm in enumerate(vms)])
+        expired = now - JOB_RETENTION_SECONDS
+        db.execute('DELETE FROM workflow_vms WHERE workflow_id IN (SELECT id FROM workflows WHERE created_at < ?)', (expired,))
+        db.execute('DELETE FROM workflows WHERE created_at < ?', (expired,))
+    return workflow_id
+
+def update_workflow_vm(workflow_id, position, **fields):
+    if 'stages' in fields:
+        fields['stages'] = json.dumps(fields['stages'])
+    assignments = ', '.join(f'{name} = ?' for name in fields)
+    with state_db() as db:
+        db.execute(f'UPDATE workflow_vms SET {assignments} WHERE workflow_id = ? AND position = ?',
+                   (*fields.values(), workflow_id, position))
+
+def workflow_cancel_requested(workflow_id):
+    with state_db() as db:
+        row = db.execute('SELECT cancel_requested FROM workflows WHERE id = ?', (workflow_id,)).fetchone()
+    return bool(row and row['cancel_requested'])
+
+def probe_ssh(host, port=22, timeout=5):
+    """True if host accepts a TCP connection on port and sends an SSH banner."""
+    try:
+        with socket.create_connection((host, port), timeout=timeout) as sock:
+            sock.settimeout(timeout)
+            return sock.recv(4).startswith(b'SSH-')
+    except OSError:
+        return False
+
+class WorkflowVM:
+    """Progress of one VM through the workflow stages, mirrored to workflow_vms."""
+
+    def __init__(self, workflow_id, position, vm):
+        self.workflow_id = workflow_id
+        self.position = position
+        self.name = vm['name']
+        self.zone = vm['zone']
+        self.project = vm.get('project')
+        self.stages = {}
+        self.started = time.monotonic()
+        self.stage_started = self.started
+        self.result = {'host': self.name, 'status': 'pending'}
+
+    def begin(self, stage, **fields):
+        self.stage_started = time.monotonic()
+        update_workflow_vm(self.workflow_id, self.position, stage=stage, status='running', **fields)
+
+    def done(self, stage, **fields):
+        """Record how long a stage took; stages are timed back to back."""
+        now = time.monotonic()
+        self.stages[stage] = round(now - self.stage_started, 2)
+        self.stage_started = now
+        update_workflow_vm(self.workflow_id, self.position, stages=self.stages, **fields)
+
+    def finish(self, status, error=None, **fields):
+        self.result['status'] = status
+        update_workflow_vm(self.workflow_id, self.position, status=status, error=error, stages=self.stages,
+                           duration=round(time.monotonic() - self.started, 2), **fields)
+
+def run_workflow_vm(vm, config, username, password, command_string, command_info, run_id, execute_slots):
+    """Move one started VM through running -> ip -> ssh -> execute."""
+    workflow_id = vm.workflow_id
+    vm.begin('running')
+    deadline = time.monotonic() + config['workflow_boot_timeout']
+    ip = None
+    while True:
+        if workflow_cancel_requested(workflow_id):
+            vm.finish('cancelled')
+            return
+        # Threads share one gcloud call per refresh; see refresh_inventory()
+        inventory, _ = refresh_inventory(max_age=WORKFLOW_POLL_SECONDS)
+        current = next((entry for entry in inventory
+                        if entry['name'] == vm.name and entry.get('project') == vm.project), None)
+        status = current.get('status') if current else None
+        if status == 'RUNNING' and 'running' not in vm.stages:
+            vm.done('running')
+            vm.begin('ip')
+        if status == 'RUNNING' and vm_ip(current):
+            ip = vm_ip(current)
+            vm.done('ip', ip=ip)
+            break
+        if status in ('TERMINATED', 'STOPPING', 'SUSPENDED') and time.monotonic() - vm.started > 60:
+            vm.finish('error', error=f'VM is {status}')
+            return
+        if time.monotonic() > deadline:
+            vm.finish('error', error=f"No running VM with an external IP after {config['workflow_boot_timeout']}s")
+            return
+        time.sleep(WORKFLOW_POLL_SECONDS)
+
+    vm.begin('ssh')
+    deadline = time.monotonic() + config['workflow_ssh_timeout']
+    while not probe_ssh(ip):
+        if workflow_cancel_requested(workflow_id):
+            vm.finish('cancelled')
+            return
+        if time.monotonic() > deadline:
+            vm.finish('error', error=f"SSH not reachable on {ip} after {config['workflow_ssh_timeout']}s")
+            return
+        time.sleep(WORKFLOW_POLL_SECONDS)
+    vm.done('ssh')
+
+    with execute_slots:
+        if workflow_cancel_requested(workflow_id):
+            vm.finish('cancelled')
+            return
+        vm.begin('execute')
+        spool = SpoolFile(output_spool_path(run_id, vm.position), CONFIG['output_preview_bytes'])
+        try:
+            host_result = run_on_host(ip, username, password, command_string, command_info, out_stream=spool)
+        finally:
+            spool.close()
+    vm.done('execute')
+    vm.result.update(output_size=spool.size, truncated=spool.truncated)
+    vm.finish(host_result['status'], error=host_result['error'], stdout=spool.preview())
+
+def run_workflow(workflow_id, vms, username, password, command_string, command_info):
+    """Execute a workflow on the background executor."""
+    config = dict(CONFIG)
+    with state_db() as db:
+        db.execute("UPDATE workflows SET status = 'running' WHERE id = ?", (workflow_id,))
+    JOBS_IN_FLIGHT.inc()
+    steps = [WorkflowVM(workflow_id, position, vm) for position, vm in enumerate(vms)]
+    run_id = None
+    try:
+        run_id = create_output_run()
+        with state_db() as db:
+            db.execute('UPDATE workflows SET output_run_id = ? WHERE id = ?', (run_id, workflow_id))
+
+        # One batched start for the VMs that are not running yet; from here on
+        # each VM proceeds on its own
+        inventory, _ = refresh_inventory(max_age=CONFIG['inventory_max_age'])
+        running = {(vm.get('project'), vm['name']) for vm in inventory if vm.get('status') == 'RUNNING'}
+        for step in steps:
+            step.begin('start')
+        to_start = [step for step in steps if (step.project, step.name) not in running]
+        started = steps
+        if to_start:
+            results, _ = run_vm_action('start', [{'name': s.name, 'zone': s.zone, 'project': s.project}
+                                                 for s in to_start])
+            expire_inventory()
+            # Keyed by project too: VMs in different projects can share a name
+            failed = {(r['project'], r['name']): r['error'] for r in results if not r['success']}
+            for step in to_start:
+                if (step.project, step.name) in failed:
+                    step.finish('error', error=f"Could not start VM: {failed[step.project, step.name]}")
+            started = [step for step in steps if (step.project, step.name) not in failed]
+        for step in started:
+            step.done('start')
+
+        execute_slots = threading.BoundedSemaphore(get_max_concurrency(command_info))
+        if started:
+            with ThreadPoolExecutor(max_workers=min(len(started), WORKFLOW_MAX_THREADS),
+                                    thread_name_prefix='workflow') as executor:
+                futures = [executor.submit(run_workflow_vm, step, config, username, password,
+                                           command_string, command_info, run_id, execute_slots)
+                           for step in started]
+                for step, future in zip(started, futures):
                     try:
-                        conn.run(command_string, hide=True, warn=True, pty=True, watchers=watchers, timeout=10)
-                    except CommandTimedOut:
-                        output_buffer.write("✅ Command successfully started. Server rebooted, connection dropped as expected.\n\n")
-                        log_event('info', 'Command completed with disconnect',
-                                 host=conn.host,
-                                 command=command_string)
-                        continue
-                else:
-                    result = conn.run(command_string, hide=True, warn=True, pty=True, watchers=watchers)
-                    stdout, stderr = result.stdout.strip(), result.stderr.strip()
-                    if stdout: output_buffer.write(f"Output:\n{stdout}\n\n")
-                    if stderr: output_buffer.write(f"Errors:\n{stderr}\n\n")
-                    if not stdout and not stderr: output_buffer.write("No output received.\n\n")
-                    
-                    log_event('info', 'Command executed successfully',
-                             host=conn.host,
-                             command=command_string,
-                             has_stdout=bool(stdout),
-                             has_stderr=bool(stderr))
-            except Exception as e:
-                error_msg = f"❌ Error on {conn.host}: {e}\n\n"
-                output_buffer.write(error_msg)
-                log_event('error', 'SSH command failed',
-                         host=conn.host,
-                         command=command_string,
-                         error=str(e),
-                         error_type=type(e).__name__)
+                        future.result()
+                    except Exception as e:
+                        step.finish('error', error=str(e))
+        status = 'cancelled' if workflow_cancel_requested(workflow_id) else 'completed'
     except Exception as e:
-        error_msg = f"\n❌ General error:\nType: {type(e).__name__}\nDetails: {e}\n"
-        output_buffer.write(error_msg)
-        log_event('error', 'SSH execution failed',
-                 command=command_string,
+        status = 'failed'
+        log_event('error', 'Workflow failed',
+                 workflow_id=workflow_id,
                  error=str(e),
-                 error_type=type(e).__name__,
-                 remote_addr=request.remote_addr)
-    
-    return output_buffer.getvalue()
+                 error_type=type(e).__name__)
+    JOBS_IN_FLIGHT.dec()
+    if run_id is not None:
+        try:
+            write_output_manifest(run_id, command_string, [step.result for step in steps])
+        except OSError as e:
+            log_event('warning', 'Could not write output manifest', run_id=run_id, error=str(e))
+    with state_db() as db:
+        db.execute('UPDATE workflows SET status = ?, finished_at = ? WHERE id = ?', (status, time.time(), workflow_id))
+        db.execute("UPDATE workflow_vms SET status = 'cancelled' WHERE workflow_id = ? AND status IN ('pending', 'running')",
+                   (workflow_id,))
+    log_event('info', 'Workflow finished',
+             workflow_id=workflow_id,
+             status=status,
+             command=command_string,
+             vm_count=len(vms))
+
+def get_workflow(workflow_id):
+    """Return a workflow with its VMs and their stage timings, or None if it does not exist."""
+    with state_db() as db:
+        workflow = db.execute('SELECT * FROM workflows WHERE id = ?', (workflow_id,)).fetchone()
+        if not workflow:
+            return None
+        workflow = dict(workflow)
+        if workflow['status'] in ('queued', 'running') and workflow['worker_pid'] and not worker_alive(workflow['worker_pid']):
+            workflow['status'] = 'interrupted'
+            db.execute("UPDATE workflows SET status = 'interrupted', finished_at = ? WHERE id = ?", (time.time(), workflow_id))
+            db.execute("UPDATE workflow_vms SET status = 'interrupted' WHERE workflow_id = ? AND status IN ('pending', 'running')",
+                       (workflow_id,))
+        rows = db.execute('SELECT position, name, zone, ip, stage, status, stages, stdout, error, duration FROM workflow_vms '
+                          'WHERE workflow_id = ? ORDER BY position', (workflow_id,)).fetchall()
+    workflow['vms'] = []
+    for row in rows:
+        vm = dict(row)
+        vm['stages'] = json.loads(vm['stages'] or '{}')
+        # The output manifest is written when the workflow ends
+        if workflow['output_run_id'] and 'execute' in vm['stages'] and workflow['status'] not in ('queued', 'running'):
+            vm['output_url'] = f"/api/output/{workflow['output_run_id']}/{vm['position']}"
+        workflow['vms'].append(vm)
+    counts = {}
+    for vm in workflow['vms']:
+        counts[vm['status']] = counts.get(vm['status'], 0) + 1
+    workflow['counts'] = counts
+    workflow.pop('cancel_requested', None)
+    workflow.pop('worker_pid', None)
+    return workflow
+
+# --- Host reachability probe ---
+# /api/probe checks many hosts at once from one event loop: a TCP connect
+# to the SSH port and reading the server's banner, each with its own
+# timeout, all within one overall deadline.
+PROBE_MAX_HOSTS = 1000
+PROBE_CONCURRENCY = 256        # connects in flight at once
+PROBE_DEFAULT_TIMEOUT = 3.0
+PROBE_MAX_SECONDS = 10.0       # overall deadline for a whole probe request
+
+def split_host_port(target, default_port=22):
+    """Split 'host' or 'host:port' (IPv6 in brackets) into (host, port)."""
+    match = re.fullmatch(r'\[([^\]]+)\](?::(\d+))?|([^:\s]+)(?::(\d+))?', target)
+    if not match:
+        raise ValueError(f"Invalid host '{target}'")
+    host = match.group(1) or match.group(3)
+    port = int(match.group(2) or match.group(4) or default_port)
+    # asyncio raises OverflowError rather than OSError for these
+    if not 1 <= port <= 65535:
+        raise ValueError(f"Invalid port {port} in '{target}'")
+    return host, port
+
+async def probe_host(target, port, timeout, slots):
+    """Connect to one host and read its SSH banner; returns a result dict."""
+    result = {'host': target, 'reachable': False, 'ssh': False, 'connect_ms': None,
+              'banner_ms': None, 'banner': None, 'error': None}
+    writer = None
+    async with slots:
+        start = time.monotonic()
+        try:
+            host, host_port = split_host_port(target, port)
+            reader, writer = await asyncio.wait_for(asyncio.open_connection(host, host_port), timeout)
+            result['reachable'] = True
+            result['connect_ms'] = round((time.monotonic() - start) * 1000, 1)
+            remaining = max(0.1, timeout - (time.monotonic() - start))
+            banner = await asyncio.wait_for(reader.readline(), remaining)
+            result['banner_ms'] = round((time.monotonic() - start) * 1000, 1)
+            result['banner'] = banner.decode('utf-8', errors='replace').strip()[:200]
+            result['ssh'] = banner.startswith(b'SSH-')
+            if not result['ssh']:
+                result['error'] = 'No SSH banner received'
+        except asyncio.TimeoutError:
+            result['error'] = f"Timed out after {timeout}s"
+        except (OSError, ValueError) as e:
+            result['error'] = str(e) or type(e).__name__
+        finally:
+            if writer is not None:
+                writer.close()
+    return result
+
+async def probe_hosts(targets, port, timeout, deadline):
+    """Probe all targets concurrently; hosts still pending at the deadline are reported as timed out."""
+    slots = asyncio.Semaphore(PROBE_CONCURRENCY)
+    tasks = [asyncio.ensure_future(probe_host(target, port, timeout, slots)) for target in targets]
+    await asyncio.wait(tasks, timeout=deadline)
+    results = []
+    for target, task in zip(targets, tasks):
+        if task.done():
+            results.append(task.result())
+        else:
+            task.cancel()
+            results.append({'host': target, 'reachable': False, 'ssh': False, 'connect_ms': None,
+                            'banner_ms': None, 'banner': None, 'error': f'Not probed within {deadline}s'})
+    return results
 
 # --- Web Interface (Routes) ---
+def parse_command_form(form):
+    """Validate the command form and return (hosts, username, password, command, error)."""
+    ips_string = form.get('ips') or ''
+    username = form.get('username')
+    password = form.get('password')
+    command_template = form.get('command')
+    hosts = [ip.strip() for ip in ips_string.splitlines() if ip.strip()]
+    final_command = command_template
+    selected_command_info = COMMAND_REGISTRY.by_template.get(command_template)
+    if selected_command_info and selected_command_info.get('requires_extra_input'):
+        extra_input = form.get('extra_input')
+        if not extra_input:
+            log_event('warning', 'Command requires additional input',
+                     command=command_template,
+                     remote_addr=request.remote_addr)
+            return hosts, username, password, None, "Error: This command requires additional input."
+        final_command = command_template.format(extra_input=extra_input)
+    if not all([hosts, username, password, command_template]):
+        log_event('warning', 'Form submitted with missing fields',
+                 remote_addr=request.remote_addr)
+        return hosts, username, password, None, "Error: Please fill in all fields."
+    return hosts, username, password, final_command, None
+
 @app.route('/', methods=['GET', 'POST'])
 def index():
     output = ""
-    gcloud_status = check_gcloud_cli()
+    output_files = []
+    gcloud_status = GCLOUD_STATUS.get()
     
     if request.method == 'POST':
-        ips_string = request.form.get('ips')
-        username = request.form.get('username')
-        password = request.form.get('password')
-        command_template = request.form.get('command')
-        hosts = [ip.strip() for ip in ips_string.splitlines() if ip.strip()]
-        final_command = command_template
-        selected_command_info = next((info for key, info in COMMAND_OPTIONS.items() if not key.startswith('_') and isinstance(info, dict) and info.get('command') == command_template), None)
-        if selected_command_info and selected_command_info.get('requires_extra_input'):
-            extra_input = request.form.get('extra_input')
-            if not extra_input:
-                output = "Error: This command requires additional input."
-                log_event('warning', 'Command requires additional input',
-                         command=command_template,
-                         remote_addr=request.remote_addr)
-                return render_template('index.html', output=output, commands=COMMAND_OPTIONS, gcloud_status=gcloud_status, config=CONFIG)
-            final_command = command_template.format(extra_input=extra_input)
-        if not all([hosts, username, password, command_template]):
-            output = "Error: Please fill in all fields."
-            log_event('warning', 'Form submitted with missing fields',
-                     remote_addr=request.remote_addr)
+        hosts, username, password, final_command, error = parse_command_form(request.form)
+        if error:
+            output = error
         else:
-            output = execute_remote_command(hosts, username, password, final_command)
-    return render_template('index.html', output=output, commands=COMMAND_OPTIONS, gcloud_status=gcloud_status, config=CONFIG)
+            output, output_files = execute_remote_command(hosts, username, password, final_command,
+                                                          compact=bool(request.form.get('compact')))
+    return render_template('index.html', output=output, output_files=output_files, commands=COMMAND_OPTIONS,
+                           gcloud_status=gcloud_status, config=CONFIG)
+
+@app.route('/execute-stream', methods=['POST'])
+def execute_stream():
+    """Run a command and stream each host's output as Server-Sent Events."""
+    hosts, username, password, final_command, error = parse_command_form(request.form)
+    if error:
+        return jsonify({'error': error}), 400
+    command_info = find_command_info(final_command)
+    if not command_info:
+        log_event('error', 'Command not found',
+                 command=final_command,
+                 remote_addr=request.remote_addr)
+        return jsonify({'error': f"The selected command '{final_command}' could not be found."}), 400
+    
+    # A streamed run holds its thread for up to run_budget; the page posts the form instead
+    if not acquire_long_stream():
+        return jsonify({'error': 'Too many open streams on this server; submit the form without streaming.'}), 503, {'Retry-After': '30'}
+    events = stream_remote_command(hosts, username, password, final_command, command_info, request.remote_addr)
+    return long_stream_response(events, 'text/event-stream')
+
+@app.route('/api/jobs', methods=['POST'])
+def submit_job():
+    """API endpoint to run a command as a background job"""
+    data = request.get_json(silent=True) or request.form.to_dict()
+    if isinstance(data.get('ips'), list):
+        data['ips'] = '\n'.join(data['ips'])
+    hosts, username, password, final_command, error = parse_command_form(data)
+    if error:
+        return jsonify({'success': False, 'error': error}), 400
+    command_info = find_command_info(final_command)
+    if not command_info:
+        log_event('error', 'Command not found',
+                 command=final_command,
+                 remote_addr=request.remote_addr)
+        return jsonify({'success': False, 'error': f"The selected command '{final_command}' could not be found."}), 400
+    
+    job_id = create_job(hosts, username, final_command, request.remote_addr)
+    JOB_EXECUTOR.submit(run_job, job_id, hosts, username, password, final_command, command_info)
+    log_event('info', 'Background job submitted',
+             job_id=job_id,
+             command=final_command,
+             host_count=len(hosts),
+             username=username,
+             remote_addr=request.remote_addr)
+    return jsonify({'success': True, 'job_id': job_id, 'status_url': f'/api/jobs/{job_id}'}), 202
+
+@app.route('/api/jobs', methods=['GET'])
+def list_jobs():
+    """API endpoint to list the most recent background jobs"""
+    limit = min(request.args.get('limit', 50, type=int), 500)
+    with state_db() as db:
+        rows = db.execute('SELECT id, command, status, host_count, username, created_at, started_at, finished_at '
+                          'FROM jobs ORDER BY created_at DESC LIMIT ?', (limit,)).fetchall()
+    return jsonify({'success': True, 'jobs': [dict(row) for row in rows]})
+
+@app.route('/api/jobs/<job_id>', methods=['GET'])
+def get_job_status(job_id):
+    """API endpoint to get the status of a background job"""
+    job = get_job(job_id)
+    if not job:
+        return jsonify({'success': False, 'error': 'Job not found'}), 404
+    return jsonify({'success': True, 'job': job})
+
+@app.route('/api/jobs/<job_id>/results', methods=['GET'])
+def get_job_results(job_id):
+    """API endpoint to get the per-host results of a background job"""
+    job = get_job(job_id)
+    if not job:
+        return jsonify({'success': False, 'error': 'Job not found'}), 404
+    with state_db() as db:
+        rows = db.execute('SELECT position, host, status, stdout, stderr, error, duration, output_url, output_size, '
+                          'truncated FROM job_hosts WHERE job_id = ? ORDER BY position', (job_id,)).fetchall()
+    if request.args.get('group') in ('1', 'true'):
+        grouper = OutputGrouper()
+        for row in rows:
+            if row['status'] not in ('pending', 'running'):
+                grouper.add({**dict(row), 'stdout': row['stdout'] or '', 'stderr': row['stderr'] or ''},
+                            output_url=row['output_url'] if row['truncated'] else None)
+        pending = [row['host'] for row in rows if row['status'] in ('pending', 'running')]
+        return jsonify({'success': True, 'job': job, 'groups': grouper.as_json(), 'pending_hosts': pending})
+    return jsonify({'success': True, 'job': job, 'results': [dict(row) for row in rows]})
+
+@app.route('/api/jobs/<job_id>/cancel', methods=['POST'])
+def cancel_job(job_id):
+    """API endpoint to cancel a background job (hosts not yet started are skipped)"""
+    with state_db() as db:
+        updated = db.execute("UPDATE jobs SET cancel_requested = 1 WHERE id = ? AND status IN ('queued', 'running')",
+                             (job_id,)).rowcount
+    if not updated:
+        job = get_job(job_id)
+        if not job:
+            return jsonify({'success': False, 'error': 'Job not found'}), 404
+        return jsonify({'success': False, 'error': f"Job is already {job['status']}"}), 409
+    log_event('info', 'Background job cancel requested',
+             job_id=job_id,
+             remote_addr=request.remote_addr)
+    return jsonify({'success': True, 'message': 'Cancel requested; hosts that have not started will be skipped'})
+
+@app.route('/api/probe', methods=['POST'])
+def probe():
+    """API endpoint to check which hosts accept SSH connections"""
+    data = request.get_json(silent=True) or request.form.to_dict()
+    targets = data.get('hosts') or data.get('ips') or []
+    if isinstance(targets, str):
+        targets = targets.split()
+    targets = list(dict.fromkeys(str(target).strip() for target in targets if str(target).strip()))
+    if not targets:
+        return jsonify({'success': False, 'error': "Provide 'hosts' to probe."}), 400
+    if len(targets) > PROBE_MAX_HOSTS:
+        return jsonify({'success': False, 'error': f'At most {PROBE_MAX_HOSTS} hosts can be probed at once.'}), 400
+    try:
+        port = int(data.get('port', 22))
+        timeout = min(max(float(data.get('timeout', PROBE_DEFAULT_TIMEOUT)), 0.1), PROBE_MAX_SECONDS)
+    except (TypeError, ValueError):
+        return jsonify({'success': False, 'error': "'port' and 'timeout' must be numbers."}), 400
+    if not 1 <= port <= 65535:
+        return jsonify({'success': False, 'error': "'port' must be between 1 and 65535."}), 400
+
+    start = time.monotonic()
+    results = asyncio.run(probe_hosts(targets, port, timeout, PROBE_MAX_SECONDS))
+    elapsed = time.monotonic() - start
+    ok = sum(1 for result in results if result['ssh'])
+    log_event('info', 'Hosts probed',
+             host_count=len(targets),
+             ssh_reachable=ok,
+             duration=f"{elapsed:.2f}s",
+             remote_addr=request.remote_addr)
+    return jsonify({
+        'success': True,
+        'results': results,
+        'ssh_reachable': ok,
+        'unreachable': len(results) - ok,
+        'duration': round(elapsed, 2)
+    })
+
+@app.route('/api/workflows', methods=['POST'])
+def submit_workflow():
+    """API endpoint to start VMs and run a command on each as soon as it is reachable"""
+    data = request.get_json(silent=True) or {}
+    vms = data.get('vms') or []
+    username, password = data.get('username'), data.get('password')
+    command = COMMAND_REGISTRY.by_name.get(data.get('command'))
+    if not isinstance(vms, list) or not vms or not username or not password or not data.get('command'):
+        return jsonify({'success': False, 'error': "Provide 'vms', 'command', 'username' and 'password'."}), 400
+    if command is None:
+        return jsonify({'success': False, 'error': f"Unknown command '{data.get('command')}'"}), 400
+    if command.get('disabled'):
+        return jsonify({'success': False, 'error': f"Command '{data.get('command')}' is disabled"}), 400
+    selected = []
+    for vm in vms:
+        name = str(vm.get('name', '')) if isinstance(vm, dict) else ''
+        zone = str(vm.get('zone', '')).rsplit('/', 1)[-1] if isinstance(vm, dict) else ''
+        project = str(vm.get('project') or '') if isinstance(vm, dict) else ''
+        if not VM_NAME_PATTERN.match(name) or not VM_NAME_PATTERN.match(zone):
+            return jsonify({'success': False, 'error': f"Invalid VM name or zone: {vm}"}), 400
+        if project and not GCP_PROJECT_PATTERN.match(project):
+            return jsonify({'success': False, 'error': f"Invalid project: {vm}"}), 400
+        selected.append({'name': name, 'zone': zone, 'project': project or None})
+    command_string = command.template
+    if command.get('requires_extra_input'):
+        if not data.get('extra_input'):
+            return jsonify({'success': False, 'error': 'This command requires extra_input.'}), 400
+        command_string = command.template.format(extra_input=data['extra_input'])
+
+    workflow_id = create_workflow(selected, username, command_string, request.remote_addr)
+    WORKFLOW_EXECUTOR.submit(run_workflow, workflow_id, selected, username, password, command_string, command)
+    log_event('info', 'Workflow submitted',
+             workflow_id=workflow_id,
+             command=command_string,
+             vm_count=len(selected),
+             username=username,
+             remote_addr=request.remote_addr)
+    return jsonify({'success': True, 'workflow_id': workflow_id, 'status_url': f'/api/workflows/{workflow_id}'}), 202
+
+@app.route('/api/workflows/<workflow_id>', methods=['GET'])
+def get_workflow_status(workflow_id):
+    """API endpoint to get the progress and per-stage timings of a workflow"""
+    workflow = get_workflow(workflow_id)
+    if not workflow:
+        return jsonify({'success': False, 'error': 'Workflow not found'}), 404
+    return jsonify({'success': True, 'workflow': workflow})
+
+@app.route('/api/workflows/<workflow_id>/cancel', methods=['POST'])
+def cancel_workflow(workflow_id):
+    """API endpoint to cancel a workflow (VMs stop before their next stage; started VMs keep running)"""
+    with state_db() as db:
+        updated = db.execute("UPDATE workflows SET cancel_requested = 1 WHERE id = ? AND status IN ('queued', 'running')",
+                             (workflow_id,)).rowcount
+    if not updated:
+        workflow = get_workflow(workflow_id)
+        if not workflow:
+            return jsonify({'success': False, 'error': 'Workflow not found'}), 404
+        return jsonify({'success': False, 'error': f"Workflow is already {workflow['status']}"}), 409
+    log_event('info', 'Workflow cancel requested',
+             workflow_id=workflow_id,
+             remote_addr=request.remote_addr)
+    return jsonify({'success': True, 'message': 'Cancel requested; VMs stop before their next stage'})
+
+def utf8_boundary(data):
+    """Length of data without a multi-byte character cut off at its end."""
+    for back in range(1, min(4, len(data)) + 1):
+        byte = data[-back]
+        if byte & 0xC0 == 0x80:
+            continue  # continuation byte, keep looking for the lead byte
+        if byte >= 0xC0:
+            needed = 2 if byte < 0xE0 else 3 if byte < 0xF0 else 4
+            return len(data) - back if needed > back else len(data)
+        return len(data)
+    return len(data)
+
+@app.route('/api/output/<run_id>', methods=['GET'])
+def get_output_run(run_id):
+    """API endpoint to list the spooled per-host outputs of a command run"""
+    manifest = read_output_manifest(run_id)
+    if manifest is None:
+        return jsonify({'success': False, 'error': 'Output not found (runs are kept for 24 hours)'}), 404
+    for entry in manifest['hosts']:
+        entry['url'] = f"/api/output/{run_id}/{entry['position']}"
+    return jsonify({'success': True, **manifest})
+
+@app.route('/api/output/<run_id>/<int:position>', methods=['GET'])
+def get_output_page(run_id, position):
+    """API endpoint to read one host's full output.
+
+    Without parameters the raw text is returned (HTTP Range requests are
+    honoured); with offset/limit a JSON page of at most limit bytes is
+    returned together with the offset of the next page.
+    """
+    manifest = read_output_manifest(run_id)
+    if manifest is None or not 0 <= position < len(manifest['hosts']):
+        return jsonify({'success': False, 'error': 'Output not found (runs are kept for 24 hours)'}), 404
+    path = output_spool_path(run_id, position)
+    if not os.path.exists(path):
+        return jsonify({'success': False, 'error': 'This host has not started yet'}), 404
+    if 'offset' not in request.args and 'limit' not in request.args:
+        return send_file(os.path.abspath(path), mimetype='text/plain', conditional=True)
+
+    offset = request.args.get('offset', 0, type=int)
+    limit = min(request.args.get('limit', 64 * 1024, type=int), OUTPUT_PAGE_MAX_BYTES)
+    if offset < 0 or limit <= 0:
+        return jsonify({'success': False, 'error': 'offset must be >= 0 and limit > 0'}), 400
+    with open(path, 'rb') as f:
+        size = os.fstat(f.fileno()).st_size
+        f.seek(offset)
+        data = f.read(limit)
+    if offset + len(data) < size:
+        data = data[:utf8_boundary(data)] or data
+    next_offset = offset + len(data)
+    return jsonify({
+        'success': True,
+        'run_id': run_id,
+        'position': position,
+        'host': manifest['hosts'][position]['host'],
+        'offset': offset,
+        'length': len(data),
+        'size': size,
+        'next_offset': next_offset if next_offset < size else None,
+        'content': data.decode('utf-8', errors='replace')
+    })
 
 @app.route('/favicon.ico')
 def favicon():
@@ -372,6 +3048,465 @@ def editor():
     log_event('info', 'Editor page accessed', remote_addr=request.remote_addr)
     return render_template('editor.html', commands=COMMAND_OPTIONS, config=CONFIG)
 
+# --- Workshop schedule store ---
+# Entries live in the shared state database; workshop_schedule.json is kept
+# as a mirror so backups taken with `docker cp` keep working, and a file
+# copied into place (restore) is imported on the next request.
+WORKSHOP_FILE = 'workshop_schedule.json'
+WORKSHOP_DATE_PATTERN = re.compile(r'^\d{4}-\d{2}-\d{2}$')
+
+class WorkshopError(Exception):
+    """A workshop request that cannot be applied; carries the HTTP status."""
+
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.status = status
+
+class WorkshopStore:
+    """Workshop schedule entries stored in SQLite, indexed by date and type."""
+
+    def __init__(self, path=WORKSHOP_FILE):
+        self.path = path
+        self.failed_signature = None
+
+    @staticmethod
+    def etag(version):
+        return f'ws-{version}'
+
+    def file_signature(self):
+        try:
+            stat = os.stat(self.path)
+        except OSError:
+            return None
+        return f'{stat.st_mtime_ns}:{stat.st_size}'
+
+    def apply(self, change, expected_version=None):
+        """Run change(db) holding the database write lock; returns (result, new version).
+
+        The version is bumped and workshop_schedule.json rewritten in the
+        same transaction, so concurrent workers cannot lose each other's edits.
+        """
+        with state_db() as db:
+            db.execute('BEGIN IMMEDIATE')
+            db.execute('INSERT OR IGNORE INTO workshop_store (id, version) VALUES (1, 0)')
+            self.sync_from_file(db)
+            if expected_version is not None and expected_version != self.version(db):
+                raise WorkshopError('The workshop schedule was changed by someone else, reload and try again', 412)
+            result = change(db)
+            db.execute('UPDATE workshop_store SET version = version + 1 WHERE id = 1')
+            self.export_to_file(db)
+            return result, self.version(db)
+
+    def file_changed(self, db):
+        row = db.execute('SELECT file_signature FROM workshop_store WHERE id = 1').fetchone()
+        signature = self.file_signature()
+        return signature is not None and (row is None or row['file_signature'] != signature)
+
+    def version(self, db):
+        row = db.execute('SELECT version FROM workshop_store WHERE id = 1').fetchone()
+        return row['version'] if row else 0
+
+    def sync_from_file(self, db):
+        """Import workshop_schedule.json if it was changed outside the application.
+
+        The file's signature is only recorded after a successful import, so a
+        broken or half-written file is tried again on the next request.
+        """
+        if not self.file_changed(db):
+            return
+        signature = self.file_signature()
+        try:
+            with open(self.path, 'r') as f:
+                entries = json.load(f)
+            self.insert_all(db, entries)
+        except (OSError, ValueError, WorkshopError) as e:
+            # Logged once per file version, not on every request that retries it
+            if signature != self.failed_signature:
+                self.failed_signature = signature
+                log_event('error', 'Could not import workshop schedule file, keeping the current schedule',
+                         path=self.path,
+                         error=str(e))
+            return
+        self.failed_signature = None
+        log_event('info', 'Workshop schedule imported from file', entry_count=len(entries))
+        db.execute("""INSERT INTO workshop_store (id, version, file_signature) VALUES (1, 1, ?)
+                      ON CONFLICT (id) DO UPDATE SET version = version + 1, file_signature = excluded.file_signature""",
+                   (signature,))
+
+    def export_to_file(self, db):
+        entries = [json.loads(row['data']) for row in db.execute('SELECT data FROM workshops ORDER BY seq')]
+        tmp_path = f'{self.path}.{os.getpid()}.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump(entries, f, indent=4)
+        os.replace(tmp_path, self.path)
+        db.execute('UPDATE workshop_store SET file_signature = ? WHERE id = 1', (self.file_signature(),))
+
+    @staticmethod
+    def normalize(entry, partial=False):
+        """Validate an entry's fields; unknown fields are kept as they are."""
+        if not isinstance(entry, dict):
+            raise WorkshopError('A workshop entry must be a JSON object')
+        if 'date' in entry or not partial:
+            if not isinstance(entry.get('date'), str) or not WORKSHOP_DATE_PATTERN.match(entry['date']):
+                raise WorkshopError("'date' must be a YYYY-MM-DD string")
+        if 'workshopType' in entry and not isinstance(entry['workshopType'], str):
+            raise WorkshopError("'workshopType' must be a string")
+        if 'vmCount' in entry:
+            try:
+                entry['vmCount'] = int(entry['vmCount'])
+            except (TypeError, ValueError):
+                raise WorkshopError("'vmCount' must be a number")
+        if 'id' in entry and not isinstance(entry['id'], int):
+            raise WorkshopError("'id' must be an integer")
+        return entry
+
+    def insert(self, db, entry):
+        db.execute('INSERT INTO workshops (id, date, workshop_type, data) VALUES (?, ?, ?, ?)',
+                   (entry['id'], entry['date'], entry.get('workshopType'), json.dumps(entry)))
+
+    def insert_all(self, db, entries):
+        if not isinstance(entries, list):
+            raise WorkshopError('The workshop schedule must be a JSON array')
+        entries = [self.normalize(dict(entry)) for entry in entries]
+        ids = [entry['id'] for entry in entries if 'id' in entry]
+        if len(ids) != len(set(ids)):
+            raise WorkshopError('Workshop entry ids must be unique')
+        db.execute('DELETE FROM workshops')
+        next_id = max(ids, default=0) + 1
+        for entry in entries:
+            if 'id' not in entry:
+                entry = {'id': next_id, **entry}
+                next_id += 1
+            self.insert(db, entry)
+
+    def list(self, date_from=None, date_to=None, workshop_type=None):
+        """Return (entries, version) in insertion order, optionally filtered."""
+        query, params = 'SELECT data FROM workshops WHERE 1 = 1', []
+        if date_from:
+            query += ' AND date >= ?'
+            params.append(date_from)
+        if date_to:
+            query += ' AND date <= ?'
+            params.append(date_to)
+        if workshop_type:
+            query += ' AND workshop_type = ?'
+            params.append(workshop_type)
+        with state_db() as db:
+            if self.file_changed(db):
+                db.execute('BEGIN IMMEDIATE')
+                self.sync_from_file(db)
+            entries = [json.loads(row['data']) for row in db.execute(query + ' ORDER BY seq', params)]
+            return entries, self.version(db)
+
+    def get(self, entry_id):
+        with state_db() as db:
+            row = db.execute('SELECT data FROM workshops WHERE id = ?', (entry_id,)).fetchone()
+            if row is None:
+                raise WorkshopError(f'Workshop entry {entry_id} not found', 404)
+            return json.loads(row['data']), self.version(db)
+
+    def create(self, entry, expected_version=None):
+        entry = self.normalize(dict(entry) if isinstance(entry, dict) else entry)
+        entry.setdefault('created', time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime()))
+
+        def change(db):
+            new_entry = entry
+            if 'id' not in entry:
+                row = db.execute('SELECT MAX(id) AS max_id FROM workshops').fetchone()
+                # Ids are millisecond timestamps when created by the planning page
+                new_entry = {'id': max(int(time.time() * 1000), (row['max_id'] or 0) + 1), **entry}
+            elif db.execute('SELECT 1 FROM workshops WHERE id = ?', (entry['id'],)).fetchone():
+                raise WorkshopError(f"Workshop entry {entry['id']} already exists", 409)
+            self.insert(db, new_entry)
+            return new_entry
+
+        return self.apply(change, expected_version)
+
+    def update(self, entry_id, changes, expected_version=None):
+        changes = self.normalize(dict(changes) if isinstance(changes, dict) else changes, partial=True)
+        changes.pop('id', None)
+
+        def change(db):
+            row = db.execute('SELECT data FROM workshops WHERE id = ?', (entry_id,)).fetchone()
+            if row is None:
+                raise WorkshopError(f'Workshop entry {entry_id} not found', 404)
+            entry = {**json.loads(row['data']), **changes}
+            db.execute('UPDATE workshops SET date = ?, workshop_type = ?, data = ? WHERE id = ?',
+                       (entry['date'], entry.get('workshopType'), json.dumps(entry), entry_id))
+            return entry
+
+        return self.apply(change, expected_version)
+
+    def delete(self, entry_id, expected_version=None):
+        def change(db):
+            if db.execute('DELETE FROM workshops WHERE id = ?', (entry_id,)).rowcount == 0:
+                raise WorkshopError(f'Workshop entry {entry_id} not found', 404)
+
+        return self.apply(change, expected_version)[1]
+
+    def replace_all(self, entries, expected_version=None):
+        return self.apply(lambda db: self.insert_all(db, entries), expected_version)[1]
+
+WORKSHOP_STORE = WorkshopStore()
+
+# --- VM pre-warming ---
+# Starts the VMs for scheduled workshops ahead of time and runs their
+# preparation command, so they are ready when the workshop begins. Only the
+# worker holding the pre-warm lock acts; see `prewarm` in COMMANDS.md.
+PREWARM_LOCK = STATE_DB + '.prewarm.lock'
+PREWARM_DEFAULTS = {
+    'enabled': False,
+    'dry_run': True,
+    'check_interval': 60,
+    'workshop_start_time': '09:00',
+    'timezone': None,
+    'ready_timeout': 900,
+    'boot_grace_seconds': 60,
+    'username': 'admin',
+    'workshop_types': {}
+}
+PREWARM_TYPE_DEFAULTS = {
+    'vm_filter': None,
+    'lead_minutes': 60,
+    'command': None,
+    'extra_input': None
+}
+
+def prewarm_config():
+    config = {**PREWARM_DEFAULTS, **(CONFIG.get('prewarm') or {})}
+    config['dry_run'] = bool(config['dry_run'])
+    return config
+
+def prewarm_type_config(config, workshop_type):
+    type_config = (config['workshop_types'] or {}).get(workshop_type)
+    return {**PREWARM_TYPE_DEFAULTS, **type_config} if type_config is not None else None
+
+def prewarm_lead_seconds(workshop_type, type_config):
+    """Lead time for a workshop type: the configured minimum, or longer if recent runs needed it."""
+    lead = type_config['lead_minutes'] * 60
+    with state_db() as db:
+        rows = db.execute("""SELECT ready_at - started_at AS took FROM prewarm_runs
+                             WHERE workshop_type = ? AND dry_run = 0 AND status = 'ready'
+                             ORDER BY started_at DESC LIMIT 5""", (workshop_type,)).fetchall()
+    if rows:
+        # Leave 50% headroom over the slowest of the last few runs
+        lead = max(lead, 1.5 * max(row['took'] for row in rows))
+    return lead
+
+def prewarm_plan(config, now=None):
+    """Scheduled workshops from today on, one item per (date, type), with their pre-warm times."""
+    tz = ZoneInfo(config['timezone']) if config['timezone'] else None
+    now = datetime.now(tz) if now is None else now
+    hour, minute = (int(part) for part in config['workshop_start_time'].split(':'))
+    entries, _ = WORKSHOP_STORE.list(date_from=now.date().isoformat())
+    grouped = {}
+    for entry in entries:
+        key = (entry['date'], entry.get('workshopType') or '')
+        grouped[key] = grouped.get(key, 0) + int(entry.get('vmCount') or 0)
+    plan = []
+    for (date, workshop_type), vm_count in sorted(grouped.items()):
+        type_config = prewarm_type_config(config, workshop_type)
+        start_at = datetime.strptime(date, '%Y-%m-%d').replace(hour=hour, minute=minute, tzinfo=tz)
+        item = {'date': date, 'workshopType': workshop_type, 'vmCount': vm_count,
+                'start_at': start_at.isoformat(), 'configured': type_config is not None}
+        if type_config is not None:
+            lead = prewarm_lead_seconds(workshop_type, type_config)
+            prewarm_at = start_at - timedelta(seconds=lead)
+            item.update({'lead_minutes': round(lead / 60, 1), 'prewarm_at': prewarm_at.isoformat(),
+                         # Late is better than never: catch up until the end of the workshop day
+                         'due': prewarm_at <= now < start_at.replace(hour=0, minute=0) + timedelta(days=1)})
+        plan.append(item)
+    return plan
+
+def claim_prewarm_run(item, dry_run):
+    """Record that a pre-warm run starts; False if it already ran or is running elsewhere."""
+    with state_db() as db:
+        db.execute('BEGIN IMMEDIATE')
+        row = db.execute('SELECT status, worker_pid FROM prewarm_runs WHERE date = ? AND workshop_type = ? AND dry_run = ?',
+                         (item['date'], item['workshopType'], int(dry_run))).fetchone()
+        if row and not (row['status'] in ('starting', 'waiting', 'preparing') and not worker_alive(row['worker_pid'])):
+            return False
+        db.execute("""INSERT OR REPLACE INTO prewarm_runs
+                      (date, workshop_type, dry_run, status, vm_count, worker_pid, started_at)
+                      VALUES (?, ?, ?, 'starting', ?, ?, ?)""",
+                   (item['date'], item['workshopType'], int(dry_run), item['vmCount'], os.getpid(), time.time()))
+    return True
+
+def update_prewarm_run(item, dry_run, **fields):
+    if 'vm_names' in fields:
+        fields['vm_names'] = json.dumps(fields['vm_names'])
+    assignments = ', '.join(f'{name} = ?' for name in fields)
+    with state_db() as db:
+        db.execute(f'UPDATE prewarm_runs SET {assignments} WHERE date = ? AND workshop_type = ? AND dry_run = ?',
+                   (*fields.values(), item['date'], item['workshopType'], int(dry_run)))
+
+def prewarm_workshop(item, config):
+    """Start and prepare the VMs for one workshop; progress is recorded in prewarm_runs."""
+    dry_run = config['dry_run']
+    type_config = prewarm_type_config(config, item['workshopType'])
+    predicate = compile_vm_filter(type_config['vm_filter'] or '')
+    if not type_config['vm_filter'] or predicate is None:
+        update_prewarm_run(item, dry_run, status='failed', finished_at=time.time(),
+                           detail=f"vm_filter '{type_config['vm_filter']}' is missing or not supported")
+        return
+
+    inventory, _ = refresh_inventory(max_age=CONFIG['inventory_max_age'])
+    vms = sorted((vm for vm in inventory if predicate(vm)),
+                 key=lambda vm: (vm['name'], vm.get('project') or ''))[:item['vmCount']]
+    names = [vm['name'] for vm in vms]
+    # VMs in different projects can share a name
+    keys = [(vm.get('project'), vm['name']) for vm in vms]
+    if not vms:
+        update_prewarm_run(item, dry_run, status='failed', finished_at=time.time(),
+                           detail=f"No VMs match '{type_config['vm_filter']}'")
+        return
+    to_start = [vm for vm in vms if vm.get('status') != 'RUNNING']
+    command_string = None
+    if type_config['command']:
+        command = COMMAND_REGISTRY.by_name.get(type_config['command'])
+        if command is None:
+            update_prewarm_run(item, dry_run, status='failed', vm_names=names, finished_at=time.time(),
+                               detail=f"Unknown command '{type_config['command']}'")
+            return
+        if command.get('disabled'):
+            update_prewarm_run(item, dry_run, status='failed', vm_names=names, finished_at=time.time(),
+                               detail=f"Command '{type_config['command']}' is disabled in commands.json")
+            return
+        command_string = command.template.format(extra_input=type_config['extra_input'] or '')
+    detail = f"{len(to_start)} of {len(vms)} VM(s) to start"
+    if len(vms) < item['vmCount']:
+        detail += f", only {len(vms)} of {item['vmCount']} requested VMs match '{type_config['vm_filter']}'"
+    if command_string:
+        detail += f", then run '{command_string}'"
+    log_event('info', 'Pre-warming workshop VMs',
+             date=item['date'],
+             workshop_type=item['workshopType'],
+             vm_names=names,
+             dry_run=dry_run,
+             detail=detail)
+    if dry_run:
+        update_prewarm_run(item, dry_run, status='dry_run', vm_names=names, detail=detail, finished_at=time.time())
+        return
+    update_prewarm_run(item, dry_run, vm_names=names, detail=detail)
+
+    if to_start:
+        results, _ = run_vm_action('start', to_start)
+        expire_inventory()
+        errors = [f"{r['project'] + '/' if r['project'] else ''}{r['name']}: {r['error']}"
+                  for r in results if not r['success']]
+        if errors:
+            update_prewarm_run(item, dry_run, status='failed', finished_at=time.time(),
+                               detail='Could not start ' + '; '.join(errors))
+            return
+
+    update_prewarm_run(item, dry_run, status='waiting')
+    deadline = time.monotonic() + config['ready_timeout']
+    while True:
+        inventory, _ = refresh_inventory(max_age=5)
+        current = {(vm.get('project'), vm['name']): vm for vm in inventory}
+        hosts = [vm_ip(current.get(key, {})) for key in keys]
+        if all(current.get(key, {}).get('status') == 'RUNNING' for key in keys) and all(hosts):
+            break
+        if time.monotonic() > deadline:
+            update_prewarm_run(item, dry_run, status='failed', finished_at=time.time(),
+                               detail=f"VMs not running after {config['ready_timeout']}s")
+            return
+        time.sleep(10)
+
+    if command_string:
+        password = os.environ.get('FSC_PREWARM_PASSWORD')
+        if not password:
+            update_prewarm_run(item, dry_run, status='failed', finished_at=time.time(),
+                               detail='FSC_PREWARM_PASSWORD is not set, cannot run the preparation command')
+            return
+        if to_start:
+            # RUNNING comes before sshd is up on freshly booted VMs
+            time.sleep(config['boot_grace_seconds'])
+        update_prewarm_run(item, dry_run, status='preparing')
+        job_id = create_job(hosts, config['username'], command_string, 'prewarm')
+        update_prewarm_run(item, dry_run, job_id=job_id)
+        run_job(job_id, hosts, config['username'], password, command_string, command)
+        job = get_job(job_id)
+        # A preparation command that reboots the VM ends with 'disconnected', which is fine
+        summary = summarize_statuses([{'status': status} for status, n in job['hosts'].items() for _ in range(n)])
+        if summary['failed'] or summary['timed_out']:
+            update_prewarm_run(item, dry_run, status='failed', finished_at=time.time(),
+                               detail=f"Preparation command failed on {summary['failed']} and timed out on "
+                                      f"{summary['timed_out']} of {len(hosts)} host(s), see job {job_id}")
+            return
+
+    now = time.time()
+    update_prewarm_run(item, dry_run, status='ready', ready_at=now, finished_at=now)
+    log_event('info', 'Workshop VMs ready',
+             date=item['date'],
+             workshop_type=item['workshopType'],
+             vm_count=len(names))
+
+def run_prewarm_scheduler():
+    """Check the schedule periodically and pre-warm due workshops; one worker at a time."""
+    lock_file = open(PREWARM_LOCK, 'a')
+    while True:
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            break
+        except OSError:
+            time.sleep(60)
+    shared_cache_set('prewarm_leader', os.getpid())
+    while True:
+        # No request may arrive for hours; pick up commands.json edits here too
+        COMMAND_REGISTRY.refresh_if_changed()
+        config = prewarm_config()
+        if config['enabled']:
+            try:
+                for item in prewarm_plan(config):
+                    if item.get('due') and claim_prewarm_run(item, config['dry_run']):
+                        threading.Thread(target=prewarm_workshop_safely, args=(item, config),
+                                         name='prewarm', daemon=True).start()
+            except Exception as e:
+                log_event('warning', 'Pre-warm check failed',
+                         error=str(e),
+                         error_type=type(e).__name__)
+        time.sleep(config['check_interval'])
+
+def prewarm_workshop_safely(item, config):
+    try:
+        prewarm_workshop(item, config)
+    except Exception as e:
+        log_event('error', 'Pre-warm failed',
+                 date=item['date'],
+                 workshop_type=item['workshopType'],
+                 error=str(e),
+                 error_type=type(e).__name__)
+        update_prewarm_run(item, config['dry_run'], status='failed', detail=str(e), finished_at=time.time())
+
+threading.Thread(target=run_prewarm_scheduler, name='prewarm-scheduler', daemon=True).start()
+
+@app.route('/api/prewarm/status')
+def prewarm_status():
+    """Pre-warm configuration, upcoming workshops with their pre-warm times, and recent runs."""
+    try:
+        config = prewarm_config()
+        with state_db() as db:
+            runs = [dict(row) for row in db.execute(
+                'SELECT * FROM prewarm_runs ORDER BY started_at DESC LIMIT 50')]
+        for run in runs:
+            run['vm_names'] = json.loads(run['vm_names'] or '[]')
+            run['dry_run'] = bool(run['dry_run'])
+            run.pop('worker_pid', None)
+        leader, _ = shared_cache_get('prewarm_leader')
+        return jsonify({
+            'success': True,
+            'enabled': config['enabled'],
+            'dry_run': config['dry_run'],
+            'password_configured': bool(os.environ.get('FSC_PREWARM_PASSWORD')),
+            'scheduler_pid': leader,
+            'upcoming': prewarm_plan(config),
+            'runs': runs
+        })
+    except Exception as e:
+        log_event('error', 'Failed to build pre-warm status', error=str(e), remote_addr=request.remote_addr)
+        return jsonify({'success': False, 'error': str(e)}), 500
+
 @app.route('/planning')
 def planning():
     """VM planning page for scheduling VM usage"""
@@ -380,16 +3515,17 @@ def planning():
 
 @app.route('/api/workshops', methods=['GET'])
 def get_workshops():
-    """API endpoint to get current workshop schedule"""
+    """API endpoint to get the whole workshop schedule as a JSON document"""
     try:
-        with open('workshop_schedule.json', 'r') as f:
-            content = f.read()
+        entries, version = WORKSHOP_STORE.list()
+        etag = WORKSHOP_STORE.etag(version)
+        if request.if_none_match.contains(etag):
+            return Response(status=304, headers={'ETag': f'"{etag}"', 'Cache-Control': 'no-cache'})
         log_event('info', 'Workshop schedule retrieved', remote_addr=request.remote_addr)
-        return jsonify({'success': True, 'content': content})
-    except FileNotFoundError:
-        log_event('info', 'Workshop schedule file not found, returning empty', 
-                 remote_addr=request.remote_addr)
-        return jsonify({'success': True, 'content': '[]'})
+        response = jsonify({'success': True, 'content': json.dumps(entries, indent=4)})
+        response.headers['ETag'] = f'"{etag}"'
+        response.headers['Cache-Control'] = 'no-cache'
+        return response
     except Exception as e:
         log_event('error', 'Failed to retrieve workshop schedule',
                  error=str(e),
@@ -398,7 +3534,7 @@ def get_workshops():
 
 @app.route('/api/workshops', methods=['POST'])
 def save_workshops():
-    """API endpoint to save workshop schedule"""
+    """API endpoint to replace the whole workshop schedule"""
     try:
         data = request.json
         content = data.get('content', '')
@@ -406,31 +3542,109 @@ def save_workshops():
         # Validate JSON before saving
         try:
             parsed = json.loads(content)
-            entry_count = len(parsed) if isinstance(parsed, list) else 0
         except json.JSONDecodeError as e:
             log_event('error', 'Invalid JSON in workshop schedule',
                      error=str(e),
                      remote_addr=request.remote_addr)
             return jsonify({'success': False, 'error': f'Invalid JSON: {str(e)}'}), 400
         
-        # Save new content with proper formatting
-        with open('workshop_schedule.json', 'w') as f:
-            json.dump(parsed, f, indent=4)
+        expected = workshop_if_match()
+        version = WORKSHOP_STORE.replace_all(parsed, expected_version=expected)
         
         log_event('info', 'Workshop schedule saved',
-                 entry_count=entry_count,
+                 entry_count=len(parsed),
                  remote_addr=request.remote_addr)
         
-        return jsonify({
+        response = jsonify({
             'success': True, 
             'message': 'Workshop schedule saved successfully'
         })
+        response.headers['ETag'] = f'"{WORKSHOP_STORE.etag(version)}"'
+        return response
+    except WorkshopError as e:
+        log_event('warning', 'Workshop schedule rejected',
+                 error=str(e),
+                 remote_addr=request.remote_addr)
+        return jsonify({'success': False, 'error': str(e)}), e.status
     except Exception as e:
         log_event('error', 'Failed to save workshop schedule',
                  error=str(e),
                  remote_addr=request.remote_addr)
         return jsonify({'success': False, 'error': str(e)}), 500
 
+def workshop_if_match():
+    """Return the store version named by an If-Match header, if any."""
+    for etag in request.if_match.as_set():
+        match = re.fullmatch(r'ws-(\d+)', etag)
+        if match:
+            return int(match.group(1))
+        raise WorkshopError('If-Match does not name a workshop schedule version', 412)
+    return None
+
+def workshop_response(body, version, status=200):
+    response = jsonify(body)
+    response.status_code = status
+    response.headers['ETag'] = f'"{WORKSHOP_STORE.etag(version)}"'
+    response.headers['Cache-Control'] = 'no-cache'
+    return response
+
+@app.route('/api/workshops/entries', methods=['GET'])
+def list_workshop_entries():
+    """List workshop entries, optionally limited to a date range (from/to) and type"""
+    try:
+        date_from = request.args.get('from')
+        date_to = request.args.get('to')
+        for value in (date_from, date_to):
+            if value and not WORKSHOP_DATE_PATTERN.match(value):
+                return jsonify({'success': False, 'error': 'Dates must be YYYY-MM-DD'}), 400
+        entries, version = WORKSHOP_STORE.list(date_from, date_to, request.args.get('type'))
+        etag = WORKSHOP_STORE.etag(version)
+        if request.if_none_match.contains(etag):
+            return Response(status=304, headers={'ETag': f'"{etag}"', 'Cache-Control': 'no-cache'})
+        return workshop_response({'success': True, 'entries': entries, 'count': len(entries)}, version)
+    except Exception as e:
+        log_event('error', 'Failed to list workshop entries', error=str(e), remote_addr=request.remote_addr)
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+@app.route('/api/workshops/entries', methods=['POST'])
+def create_workshop_entry():
+    """Add one workshop entry"""
+    try:
+        entry, version = WORKSHOP_STORE.create(request.get_json(silent=True), expected_version=workshop_if_match())
+        log_event('info', 'Workshop entry created',
+                 entry_id=entry['id'],
+                 date=entry.get('date'),
+                 workshop_type=entry.get('workshopType'),
+                 remote_addr=request.remote_addr)
+        return workshop_response({'success': True, 'entry': entry}, version, 201)
+    except WorkshopError as e:
+        return jsonify({'success': False, 'error': str(e)}), e.status
+    except Exception as e:
+        log_event('error', 'Failed to create workshop entry', error=str(e), remote_addr=request.remote_addr)
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+@app.route('/api/workshops/entries/<int:entry_id>', methods=['GET', 'PUT', 'DELETE'])
+def workshop_entry(entry_id):
+    """Read, update (merging the given fields) or delete one workshop entry"""
+    try:
+        if request.method == 'GET':
+            entry, version = WORKSHOP_STORE.get(entry_id)
+            return workshop_response({'success': True, 'entry': entry}, version)
+        if request.method == 'PUT':
+            entry, version = WORKSHOP_STORE.update(entry_id, request.get_json(silent=True),
+                                                  expected_version=workshop_if_match())
+            log_event('info', 'Workshop entry updated', entry_id=entry_id, remote_addr=request.remote_addr)
+            return workshop_response({'success': True, 'entry': entry}, version)
+        version = WORKSHOP_STORE.delete(entry_id, expected_version=workshop_if_match())
+        log_event('info', 'Workshop entry deleted', entry_id=entry_id, remote_addr=request.remote_addr)
+        return workshop_response({'success': True}, version)
+    except WorkshopError as e:
+        return jsonify({'success': False, 'error': str(e)}), e.status
+    except Exception as e:
+        log_event('error', 'Failed to change workshop entry',
+                 entry_id=entry_id, error=str(e), remote_addr=request.remote_addr)
+        return jsonify({'success': False, 'error': str(e)}), 500
+
 @app.route('/api/commands', methods=['GET'])
 def get_commands():
     """API endpoint to get current commands.json content"""
@@ -465,9 +3679,10 @@ def save_commands():
         import shutil
         shutil.copy('commands.json', 'commands.json.backup')
         
-        # Save new content
-        with open('commands.json', 'w') as f:
+        # Save new content atomically so other workers never read a partial file
+        with open('commands.json.tmp', 'w') as f:
             f.write(content)
+        os.replace('commands.json.tmp', 'commands.json')
         
         # Reload application state
         reload_application_state()
@@ -495,9 +3710,292 @@ def get_status():
     return jsonify({
         'commands_count': len(COMMAND_OPTIONS),
         'config': CONFIG,
+        'command_errors': COMMAND_REGISTRY.errors,
+        'inventory_projects': shared_cache_get('inventory_projects')[0] or [],
         'available_commands': [name for name, info in COMMAND_OPTIONS.items() if not name.startswith('_') and isinstance(info, dict)]
     })
 
+@app.route('/api/ssh-pool')
+def get_ssh_pool_stats():
+    """API endpoint to inspect the SSH connection pool of the answering worker."""
+    return jsonify(SSH_POOL.snapshot())
+
+@app.route('/metrics')
+def metrics():
+    """Prometheus metrics, aggregated across all gunicorn workers."""
+    if prometheus_client is None:
+        return Response('prometheus_client is not installed\n', status=503, mimetype='text/plain')
+    return Response(prometheus_client.generate_latest(metrics_registry()),
+                    mimetype=prometheus_client.CONTENT_TYPE_LATEST)
+
+# --- Log query API ---
+# /api/logs streams matching records from logs/ (current file plus rotated
+# ones) as NDJSON. Files are read line by line, never loaded whole, and a
+# sparse time -> offset index per file lets time-bounded queries seek
+# close to the first matching line instead of scanning from the start.
+LOG_QUERY_MAX_RESULTS = 10000
+LOG_FOLLOW_MAX_SECONDS = 600
+LOG_TIME_SLACK = 5  # seconds of out-of-order records tolerated around time bounds
+LOG_LEVELS = {'DEBUG': 10, 'INFO': 20, 'WARNING': 30, 'ERROR': 40, 'CRITICAL': 50}
+LOG_TEXT_TIME = re.compile(rb'^(\d{4}-\d{2}-\d{2} \d{2}:\d{2}:\d{2}),(\d{3}) \| ')
+LOG_RELATIVE_TIME = re.compile(r'^(\d+)([smhd])$')
+
+def log_path(name):
+    """Path of the live access or events log in the configured format."""
+    ext = '.jsonl' if os.environ.get('FSC_LOG_FORMAT', 'text') == 'json' else '.log'
+    return os.path.join('logs', name + ext)
+
+def log_files(name):
+    """Paths of a log and its rotated copies, oldest first."""
+    base = log_path(name)
+    rotated = [f'{base}.{i}' for i in range(log_writer.LOG_BACKUP_COUNT, 0, -1)]
+    return [path for path in rotated + [base] if os.path.exists(path)]
+
+def log_line_time(line):
+    """Timestamp (epoch seconds) of a raw log line, or None if it has none."""
+    match = LOG_TEXT_TIME.match(line)
+    if match:
+        stamp = match.group(1).decode()
+        millis = int(match.group(2))
+    elif line.startswith(b'{"time": "'):
+        stamp = line[10:29].decode(errors='replace').replace('T', ' ')
+        millis = int(line[30:33]) if line[29:30] == b'.' else 0
+    else:
+        return None
+    try:
+        return time.mktime(time.strptime(stamp, '%Y-%m-%d %H:%M:%S')) + millis / 1000
+    except ValueError:
+        return None
+
+def parse_log_line(line, name):
+    """Turn a raw access or event log line (text or JSON lines) into a record dict."""
+    text = line.decode('utf-8', errors='replace').rstrip('\n')
+    if text.startswith('{'):
+        try:
+            record = json.loads(text)
+        except ValueError:
+            return None
+        record.pop('logger', None)
+        return record
+    parts = text.split(' | ')
+    if len(parts) < 3:
+        return None
+    if name == 'access':
+        keys = ('remote_addr', 'method', 'path', 'status', 'user_agent')
+        record = {'time': parts[0], 'level': 'INFO', **dict(zip(keys, parts[1:]))}
+    else:
+        record = {'time': parts[0], 'level': parts[1], 'message': parts[2]}
+        for part in parts[3:]:
+            key, sep, value = part.partition('=')
+            if sep:
+                record[key] = value
+    return record
+
+class LogFileIndex:
+    """Sparse (timestamp, offset) samples per log file, taken every `stride` bytes.
+
+    Entries are keyed by device and inode, so rotated files (renamed, never
+    changed again) keep their index, and the live file is only sampled past
+    the point already indexed.
+    """
+    stride = 256 * 1024
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.entries = {}
+
+    def points(self, f):
+        stat = os.fstat(f.fileno())
+        key = (stat.st_dev, stat.st_ino)
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None or entry['next'] > stat.st_size + self.stride:
+                if len(self.entries) > 100:
+                    self.entries.clear()
+                entry = self.entries[key] = {'next': 0, 'points': []}
+            pos = entry['next']
+            while pos < stat.st_size:
+                f.seek(pos)
+                if pos:
+                    f.readline()  # skip the partial line we landed in
+                offset = f.tell()
+                ts = log_line_time(f.readline())
+                if ts is not None:
+                    entry['points'].append((ts, offset))
+                pos += self.stride
+            entry['next'] = pos
+            return list(entry['points'])
+
+    def seek(self, f, since):
+        """Move f to an offset at or before the first record newer than `since`."""
+        points = self.points(f)
+        i = bisect.bisect_left([ts for ts, _ in points], since - LOG_TIME_SLACK) - 1
+        f.seek(points[i][1] if i >= 0 else 0)
+
+LOG_INDEX = LogFileIndex()
+
+def read_lines_backward(f, block_size=64 * 1024):
+    """Yield the complete lines of a binary file from last to first."""
+    f.seek(0, os.SEEK_END)
+    pos = f.tell()
+    remainder = b''
+    while pos > 0:
+        read = min(block_size, pos)
+        pos -= read
+        f.seek(pos)
+        lines = (f.read(read) + remainder).split(b'\n')
+        remainder = lines.pop(0)
+        for line in reversed(lines):
+            if line:
+                yield line + b'\n'
+    if remainder:
+        yield remainder + b'\n'
+
+def parse_log_time_param(value):
+    """Epoch seconds for an ISO date/time or a relative age such as 15m, 2h or 1d."""
+    if not value:
+        return None
+    match = LOG_RELATIVE_TIME.match(value)
+    if match:
+        return time.time() - int(match.group(1)) * {'s': 1, 'm': 60, 'h': 3600, 'd': 86400}[match.group(2)]
+    return datetime.fromisoformat(value.replace(' ', 'T')).timestamp()
+
+def log_record_matcher(args):
+    """Build a predicate over (raw line, record) from the /api/logs query parameters."""
+    min_level = LOG_LEVELS.get((args.get('level') or 'DEBUG').upper())
+    if min_level is None:
+        raise ValueError(f"Unknown level '{args.get('level')}'")
+    host, command, remote_addr, text = (args.get('host'), args.get('command'),
+                                        args.get('remote_addr'), args.get('q'))
+    needle = text.encode() if text else None
+
+    def matches(line, record):
+        if needle and needle not in line:
+            return False
+        if LOG_LEVELS.get(record.get('level'), 0) < min_level:
+            return False
+        if host and record.get('host') != host:
+            return False
+        if command and command not in str(record.get('command', '')):
+            return False
+        if remote_addr and record.get('remote_addr') != remote_addr:
+            return False
+        return True
+    return matches
+
+def query_log(name, since, until, matches):
+    """Yield matching records oldest first, seeking past older lines with the index."""
+    for path in log_files(name):
+        with open(path, 'rb') as f:
+            if since is not None:
+                LOG_INDEX.seek(f, since)
+            for line in f:
+                ts = log_line_time(line)
+                if ts is None:
+                    continue
+                if since is not None and ts < since:
+                    continue
+                if until is not None and ts > until:
+                    if ts > until + LOG_TIME_SLACK:
+                        return
+                    continue
+                record = parse_log_line(line, name)
+                if record is not None and matches(line, record):
+                    yield record
+
+def tail_log(name, count, since, matches):
+    """The last `count` matching records, oldest first, reading files from the end."""
+    found = []
+    for path in reversed(log_files(name)):
+        with open(path, 'rb') as f:
+            for line in read_lines_backward(f):
+                ts = log_line_time(line)
+                if ts is None:
+                    continue
+                if since is not None and ts < since - LOG_TIME_SLACK:
+                    return list(reversed(found))
+                record = parse_log_line(line, name)
+                if record is not None and (since is None or ts >= since) and matches(line, record):
+                    found.append(record)
+                    if len(found) >= count:
+                        return list(reversed(found))
+    return list(reversed(found))
+
+def follow_log(name, matches, deadline):
+    """Yield records appended to the live log file until the deadline, following rotation."""
+    path = log_path(name)
+    try:
+        f = open(path, 'rb')
+    except FileNotFoundError:
+        return
+    f.seek(0, os.SEEK_END)
+    partial = b''
+    try:
+        while time.monotonic() < deadline:
+            chunk = f.readline()
+            if chunk:
+                partial += chunk
+                if not partial.endswith(b'\n'):
+                    continue
+                line, partial = partial, b''
+                record = parse_log_line(line, name) if log_line_time(line) is not None else None
+                if record is not None and matches(line, record):
+                    yield record
+                continue
+            try:
+                rotated = os.stat(path).st_ino != os.fstat(f.fileno()).st_ino
+            except FileNotFoundError:
+                rotated = False
+            if rotated:
+                f.close()
+                f = open(path, 'rb')
+                continue
+            time.sleep(1)
+    finally:
+        f.close()
+
+@app.route('/api/logs')
+def get_logs():
+    """Stream log records matching the query as NDJSON (one JSON object per line)."""
+    args = request.args
+    name = args.get('log', 'events')
+    if name not in ('events', 'access'):
+        return jsonify({'success': False, 'error': "log must be 'events' or 'access'"}), 400
+    try:
+        since = parse_log_time_param(args.get('since'))
+        until = parse_log_time_param(args.get('until'))
+        matches = log_record_matcher(args)
+        tail = int(args['tail']) if args.get('tail') else None
+        limit = min(int(args.get('limit', 1000)), LOG_QUERY_MAX_RESULTS)
+    except ValueError as e:
+        return jsonify({'success': False, 'error': f'Invalid query: {e}'}), 400
+    follow = args.get('follow') in ('1', 'true')
+    if follow and not acquire_long_stream():
+        return jsonify({'success': False, 'error': 'Too many open streams on this server; query without follow instead.'}), 503, {'Retry-After': '30'}
+    
+    log_event('info', 'Log query',
+             log=name,
+             query=request.query_string.decode(errors='replace')[:500],
+             remote_addr=request.remote_addr)
+    
+    def generate():
+        if tail is not None:
+            records = tail_log(name, min(tail, LOG_QUERY_MAX_RESULTS), since, matches)
+        else:
+            records = itertools.islice(query_log(name, since, until, matches), limit)
+        for record in records:
+            yield json.dumps(record) + '\n'
+        if follow:
+            for record in follow_log(name, matches, time.monotonic() + LOG_FOLLOW_MAX_SECONDS):
+                yield json.dumps(record) + '\n'
+    
+    if follow:
+        return long_stream_response(generate(), 'application/x-ndjson')
+    return Response(generate(), mimetype='application/x-ndjson', headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no'
+    })
+
 # --- GCloud CLI Check ---
 def check_gcloud_cli():
     """Check if gcloud CLI is installed and working."""
@@ -512,7 +4010,7 @@ def check_gcloud_cli():
     }
     
     try:
-        result = subprocess.run(['gcloud', '--version'], capture_output=True, text=True, timeout=10)
+        result = run_gcloud(['gcloud', '--version'], capture_output=True, text=True, timeout=10)
         if result.returncode != 0:
             status['errors'].append(f"gcloud CLI is not working properly: {result.stderr}")
             return status
@@ -520,7 +4018,7 @@ def check_gcloud_cli():
         status['installed'] = True
         
         # Check if user is authenticated
-        auth_result = subprocess.run(['gcloud', 'auth', 'list', '--filter=status:ACTIVE', '--format=value(account)'], 
+        auth_result = run_gcloud(['gcloud', 'auth', 'list', '--filter=status:ACTIVE', '--format=value(account)'], 
                                    capture_output=True, text=True, timeout=10)
         if not auth_result.stdout.strip():
             status['warnings'].append("No active gcloud authentication found. Please run: gcloud auth login")
@@ -529,7 +4027,7 @@ def check_gcloud_cli():
             status['account'] = auth_result.stdout.strip()
             
         # Check if project is set
-        project_result = subprocess.run(['gcloud', 'config', 'get-value', 'project'], 
+        project_result = run_gcloud(['gcloud', 'config', 'get-value', 'project'], 
                                       capture_output=True, text=True, timeout=10)
         if not project_result.stdout.strip():
             status['warnings'].append("No gcloud project configured. Please run: gcloud config set project YOUR_PROJECT_ID")
@@ -549,10 +4047,68 @@ def check_gcloud_cli():
         status['errors'].append(f"Error checking gcloud CLI: {e}")
         return status
 
+class GcloudStatusCache:
+    """TTL cache for check_gcloud_cli() shared by all workers.
+
+    Reads never wait for gcloud: a stale entry is returned as-is while a
+    background thread refreshes it, and before the first check completes a
+    placeholder status with ``checking`` set is returned.
+    """
+
+    def __init__(self, ttl):
+        self.ttl = ttl
+        self.lock = threading.Lock()
+        self.refreshing = False
+
+    def get(self):
+        status, updated_at = shared_cache_get('gcloud_status')
+        if status is None or time.time() - updated_at >= self.ttl:
+            self.refresh_async()
+        if status is None:
+            return {'checking': True, 'installed': False, 'authenticated': False, 'project_set': False,
+                    'account': '', 'project': '', 'errors': [], 'warnings': [], 'age': None}
+        status['age'] = round(time.time() - updated_at, 1)
+        return status
+
+    def refresh_async(self):
+        with self.lock:
+            if self.refreshing:
+                return
+            self.refreshing = True
+        threading.Thread(target=self.refresh, name='gcloud-status', daemon=True).start()
+
+    def refresh(self):
+        """Run the gcloud checks now and store the result."""
+        try:
+            status = VM_BACKEND.status()
+            shared_cache_set('gcloud_status', status)
+            status['age'] = 0.0
+            return status
+        finally:
+            with self.lock:
+                self.refreshing = False
+
+GCLOUD_STATUS = GcloudStatusCache(CONFIG['gcloud_status_ttl'])
+
+@app.route('/api/gcloud-status', methods=['GET'])
+def get_gcloud_status():
+    """API endpoint to get the cached gcloud CLI status"""
+    return jsonify(GCLOUD_STATUS.get())
+
+@app.route('/api/gcloud-status/refresh', methods=['POST'])
+def refresh_gcloud_status():
+    """API endpoint to re-run the gcloud CLI checks immediately"""
+    status = GCLOUD_STATUS.refresh()
+    log_event('info', 'gcloud status refreshed',
+             installed=status['installed'],
+             authenticated=status['authenticated'],
+             remote_addr=request.remote_addr)
+    return jsonify(status)
+
 # --- Applicatie Startpunt ---
 if __name__ == '__main__':
     print("🔍 Checking gcloud CLI...")
-    gcloud_status = check_gcloud_cli()
+    gcloud_status = GCLOUD_STATUS.refresh()
     
     if gcloud_status['errors']:
         print("❌ gcloud CLI issues found:")
@@ -0,0 +1,146 @@
+#!/usr/bin/env python3
+"""Stand-in Fabric Studio SSH servers for offline benchmarks.
+
+Listens on --hosts consecutive ports starting at --base-port on 127.0.0.1,
+one port per emulated VM, so each "host" gets its own connections (and its
+own entry in the controller's SSH pool). Password authentication accepts any
+user with --password. Commands answer roughly like the Fabric Studio CLI:
+
+- ``runtime fabric install ...`` / ``runtime fabric uninstall``: progress
+  output spread over --latency seconds
+- ``execute shutdown``: asks "Confirm shutdown (y/n)?", then drops the
+  connection after the answer
+- ``system execute shutdown|upgrade ...``: drops the connection
+- ``execute password guest <pw>``: confirms the change
+- anything else: "Unknown command", exit status 1
+
+    python bench/fake_ssh_server.py --hosts 200 --base-port 22000 --latency 0.5
+"""
+import argparse
+import logging
+import socket
+import threading
+import time
+
+import paramiko
+
+
+class FakeFabricStudio(paramiko.ServerInterface):
+    def __init__(self, password):
+        self.password = password
+        self.command = None
+        self.command_ready = threading.Event()
+
+    def check_auth_password(self, username, password):
+        return paramiko.AUTH_SUCCESSFUL if password == self.password else paramiko.AUTH_FAILED
+
+    def get_allowed_auths(self, username):
+        return 'password'
+
+    def check_channel_request(self, kind, chanid):
+        return paramiko.OPEN_SUCCEEDED if kind == 'session' else paramiko.OPEN_FAILED_ADMINISTRATIVELY_PROHIBITED
+
+    def check_channel_pty_request(self, *args):
+        return True
+
+    def check_channel_exec_request(self, channel, command):
+        self.command = command.decode(errors='replace')
+        self.command_ready.set()
+        return True
+
+
+def progress(channel, label, args):
+    """Send --output-lines lines of about --line-bytes each, spread over --latency seconds."""
+    lines = max(args.output_lines, 1)
+    pause = args.latency / lines
+    padding = 'x' * max(args.line_bytes - len(label) - 16, 0)
+    for i in range(lines):
+        time.sleep(pause)
+        channel.sendall(f'{label} [{i + 1}/{lines}] {padding}\r\n'.encode())
+
+
+def run_command(channel, transport, command, args):
+    """Emulate one CLI command; returns False if the connection should be dropped."""
+    if command.startswith('runtime fabric '):
+        progress(channel, f'{command}:', args)
+        channel.sendall(b'Done.\r\n')
+        channel.send_exit_status(0)
+    elif command == 'execute shutdown':
+        channel.sendall(b'Confirm shutdown (y/n)? ')
+        channel.recv(16)
+        channel.sendall(b'\r\nSystem is shutting down...\r\n')
+        return False
+    elif command.startswith('system execute '):
+        progress(channel, f'{command}:', args)
+        return False
+    elif command.startswith('execute password guest '):
+        time.sleep(args.latency)
+        channel.sendall(b'Password for guest changed.\r\n')
+        channel.send_exit_status(0)
+    else:
+        channel.sendall(f'Unknown command: {command}\r\n'.encode())
+        channel.send_exit_status(1)
+    return True
+
+
+def handle_connection(sock, host_key, args):
+    transport = paramiko.Transport(sock)
+    transport.add_server_key(host_key)
+    server = FakeFabricStudio(args.password)
+    try:
+        transport.start_server(server=server)
+    except (paramiko.SSHException, EOFError, OSError):
+        return
+    try:
+        # Pooled connections run one command per channel, many channels per connection
+        while transport.is_active():
+            channel = transport.accept(timeout=args.idle_timeout)
+            if channel is None:
+                return
+            if not server.command_ready.wait(10):
+                channel.close()
+                continue
+            server.command_ready.clear()
+            keep = run_command(channel, transport, server.command, args)
+            channel.close()
+            if not keep:
+                return
+    except (paramiko.SSHException, EOFError, OSError):
+        pass
+    finally:
+        transport.close()
+
+
+def listen(port, host_key, args):
+    listener = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    listener.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    listener.bind(('127.0.0.1', port))
+    listener.listen(64)
+    while True:
+        sock, _ = listener.accept()
+        threading.Thread(target=handle_connection, args=(sock, host_key, args), daemon=True).start()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--hosts', type=int, default=10, help='number of emulated hosts (ports)')
+    parser.add_argument('--base-port', type=int, default=22000)
+    parser.add_argument('--password', default='bench')
+    parser.add_argument('--latency', type=float, default=0.5, help='seconds a command takes')
+    parser.add_argument('--output-lines', type=int, default=10, help='lines of output per command')
+    parser.add_argument('--line-bytes', type=int, default=80, help='approximate length of each output line')
+    parser.add_argument('--idle-timeout', type=float, default=600, help='close connections idle this long')
+    args = parser.parse_args()
+
+    # Port probes and dropped clients are expected; keep paramiko's tracebacks quiet
+    logging.getLogger('paramiko').setLevel(logging.CRITICAL)
+    host_key = paramiko.RSAKey.generate(2048)
+    for port in range(args.base_port, args.base_port + args.hosts):
+        threading.Thread(target=listen, args=(port, host_key, args), daemon=True).start()
+    print(f'Fake Fabric Studio SSH on 127.0.0.1:{args.base_port}-{args.base_port + args.hosts - 1}', flush=True)
+    while True:
+        time.sleep(3600)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,283 @@
+#!/usr/bin/env python3
+"""Offline benchmarks for the controller's hot paths.
+
+Starts the fake Fabric Studio SSH server (bench/fake_ssh_server.py), puts the
+fake gcloud (bench/bin/gcloud) first on PATH, loads app.py in a scratch
+directory and runs:
+
+- fanout-N: execute_remote_command() on N hosts, first with a cold SSH pool
+  and again with the connections pooled (default N = 10, 50, 200)
+- get-vms-polling: several clients polling /get-vms for a while, half of
+  them sending If-None-Match like a browser does
+- start-vms-bulk: /start-vms with a large batch of the listed VMs, spread
+  over several zones
+
+The get-vms and start-vms scenarios run once per --backends entry; `rest`
+uses tools/fake_compute_api.py. Results are printed as JSON (and written to
+--output) so they can be compared between commits:
+
+    python bench/run_bench.py --output bench-results.json
+    python bench/run_bench.py --fanout 10,50 --latency 1.0 --backends gcloud,rest
+"""
+import argparse
+import json
+import os
+import platform
+import re
+import shutil
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_DIR = os.path.dirname(BENCH_DIR)
+SSH_PASSWORD = 'bench'
+FANOUT_COMMAND = 'runtime fabric install --power-on-vms FAZ-Workshop2025'
+HOST_DURATION = re.compile(r'^Host: (\S+) \((\d+(?:\.\d+)?)s\)$', re.M)
+
+
+def summarize(values):
+    """min/p50/p95/max/mean of a list of seconds, rounded to milliseconds."""
+    if not values:
+        return None
+    ordered = sorted(values)
+    pick = lambda q: ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+    return {key: round(value, 4) for key, value in {
+        'min': ordered[0], 'p50': pick(0.5), 'p95': pick(0.95), 'max': ordered[-1],
+        'mean': statistics.fmean(ordered)}.items()}
+
+
+def wait_for_port(port, timeout=30):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            with socket.create_connection(('127.0.0.1', port), timeout=1):
+                return
+        except OSError:
+            time.sleep(0.1)
+    raise RuntimeError(f'Nothing listening on port {port} after {timeout}s')
+
+
+def count_lines(path):
+    try:
+        with open(path) as f:
+            return sum(1 for _ in f)
+    except FileNotFoundError:
+        return 0
+
+
+def load_app(workdir, args):
+    """Import app.py with its state, logs and commands.json in a scratch directory."""
+    with open(os.path.join(REPO_DIR, 'commands.json')) as f:
+        commands = json.load(f)
+    commands.setdefault('_config', {}).update({
+        'vm_backend': 'gcloud',
+        'compute_api_endpoint': f'http://127.0.0.1:{args.compute_port}/compute/v1',
+        'gcp_project': 'fake-project',
+    })
+    with open(os.path.join(workdir, 'commands.json'), 'w') as f:
+        json.dump(commands, f, indent=2)
+    os.chdir(workdir)
+    sys.path.insert(0, REPO_DIR)
+    import app
+    return app
+
+
+def set_backend(app, backend):
+    app.CONFIG['vm_backend'] = backend
+    app.VM_BACKEND = app.create_vm_backend(app.CONFIG)
+    app.expire_inventory()
+
+
+def bench_fanout(app, host_count, args):
+    hosts = [f'127.0.0.1:{args.base_port + i}' for i in range(host_count)]
+    pool_size, idle_timeout = app.CONFIG['ssh_pool_size'], app.CONFIG['ssh_pool_idle_timeout']
+    result = {'hosts': host_count, 'max_concurrency': app.CONFIG['max_concurrency']}
+    for run in ('cold', 'warm'):
+        if run == 'cold':
+            # Close pooled connections so every host needs a fresh handshake
+            app.SSH_POOL.configure(pool_size, 0)
+            app.SSH_POOL.configure(pool_size, idle_timeout)
+        start = time.monotonic()
+        # execute_remote_command() logs the requester's address
+        with app.app.test_request_context():
+            output, _ = app.execute_remote_command(hosts, 'admin', SSH_PASSWORD, FANOUT_COMMAND)
+        wall = time.monotonic() - start
+        durations = [float(seconds) for _, seconds in HOST_DURATION.findall(output)]
+        result[run] = {
+            'wall_seconds': round(wall, 3),
+            'hosts_per_second': round(host_count / wall, 2),
+            'errors': output.count('❌ Error'),
+            'host_seconds': summarize(durations),
+        }
+    return result
+
+
+def bench_get_vms(app, args, backend):
+    client_count, duration = args.poll_clients, args.poll_seconds
+    calls_before = count_lines(os.environ['FAKE_GCLOUD_LOG'])
+    latencies, statuses, lock = [], {}, threading.Lock()
+    deadline = time.monotonic() + duration
+
+    def poll(conditional):
+        client = app.app.test_client()
+        etag = None
+        while time.monotonic() < deadline:
+            headers = {'If-None-Match': etag} if conditional and etag else {}
+            start = time.monotonic()
+            response = client.get('/get-vms', query_string={'filter': args.vm_filter}, headers=headers)
+            elapsed = time.monotonic() - start
+            etag = response.headers.get('ETag', etag)
+            with lock:
+                latencies.append(elapsed)
+                statuses[response.status_code] = statuses.get(response.status_code, 0) + 1
+            time.sleep(args.poll_interval)
+
+    threads = [threading.Thread(target=poll, args=(i % 2 == 1,)) for i in range(client_count)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    result = {
+        'backend': backend,
+        'clients': client_count,
+        'seconds': duration,
+        'requests': len(latencies),
+        'requests_per_second': round(len(latencies) / duration, 2),
+        'status_codes': {str(code): n for code, n in sorted(statuses.items())},
+        'latency_seconds': summarize(latencies),
+    }
+    if backend == 'gcloud':
+        result['gcloud_calls'] = count_lines(os.environ['FAKE_GCLOUD_LOG']) - calls_before
+    return result
+
+
+def bench_start_vms(app, args, backend):
+    client = app.app.test_client()
+    # Start the VMs the backend actually lists, in whatever zones it puts them
+    listed = client.get('/get-vms', query_string={'filter': args.vm_filter}).get_json()
+    vms = [{'name': vm['name'], 'zone': vm['zone']} for vm in listed[:args.start_vms]]
+    latencies, dispatch, failures = [], [], 0
+    calls_before = count_lines(os.environ['FAKE_GCLOUD_LOG'])
+    for _ in range(args.start_repeats):
+        start = time.monotonic()
+        response = client.post('/start-vms', json={'vms': vms})
+        latencies.append(time.monotonic() - start)
+        body = response.get_json()
+        dispatch.append(body.get('dispatch_seconds', 0))
+        failures += sum(1 for result in body.get('results', []) if not result['success'])
+    result = {
+        'backend': backend,
+        'vms': len(vms),
+        'repeats': args.start_repeats,
+        'failed_vms': failures,
+        'request_seconds': summarize(latencies),
+        'dispatch_seconds': summarize(dispatch),
+    }
+    if backend == 'gcloud':
+        result['gcloud_calls_per_request'] = (count_lines(os.environ['FAKE_GCLOUD_LOG']) - calls_before) / args.start_repeats
+    return result
+
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=REPO_DIR,
+                              capture_output=True, text=True, timeout=10).stdout.strip() or None
+    except OSError:
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--fanout', default='10,50,200', help='comma-separated host counts')
+    parser.add_argument('--latency', type=float, default=0.5, help='seconds a fake SSH command takes')
+    parser.add_argument('--output-lines', type=int, default=10, help='output lines per fake SSH command')
+    parser.add_argument('--line-bytes', type=int, default=80)
+    parser.add_argument('--base-port', type=int, default=22000)
+    parser.add_argument('--gcloud-latency', type=float, default=0.3, help='seconds each fake gcloud call takes')
+    parser.add_argument('--instances', type=int, default=200, help='VMs listed by the fake gcloud / API')
+    parser.add_argument('--backends', default='gcloud', help='comma-separated: gcloud, rest')
+    parser.add_argument('--compute-port', type=int, default=8085)
+    parser.add_argument('--poll-clients', type=int, default=8)
+    parser.add_argument('--poll-seconds', type=float, default=20)
+    parser.add_argument('--poll-interval', type=float, default=0.5)
+    parser.add_argument('--vm-filter', default='name~^sru-fstudio-faz')
+    parser.add_argument('--start-vms', type=int, default=200)
+    parser.add_argument('--start-repeats', type=int, default=3)
+    parser.add_argument('--output', help='also write the results to this file')
+    parser.add_argument('--skip', default='', help='comma-separated scenarios to skip: fanout, get-vms, start-vms')
+    args = parser.parse_args()
+
+    fanout = [int(n) for n in args.fanout.split(',') if n]
+    backends = [b for b in args.backends.split(',') if b]
+    skip = set(args.skip.split(','))
+    workdir = tempfile.mkdtemp(prefix='fsc-bench-')
+    os.environ['PATH'] = os.path.join(BENCH_DIR, 'bin') + os.pathsep + os.environ['PATH']
+    os.environ.update({
+        'FAKE_GCLOUD_LATENCY': str(args.gcloud_latency),
+        'FAKE_GCLOUD_INSTANCES': str(args.instances),
+        'FAKE_GCLOUD_LOG': os.path.join(workdir, 'gcloud-calls.log'),
+        'FSC_STATE_DB': os.path.join(workdir, 'state.db'),
+        'FSC_SPOOL_DIR': os.path.join(workdir, 'spool'),
+        'GOOGLE_OAUTH_ACCESS_TOKEN': 'fake-token',
+    })
+    # Logs and metrics stay in-process; do not talk to a running gunicorn's log writer
+    os.environ.pop('FSC_LOG_SOCKET', None)
+    os.environ.pop('PROMETHEUS_MULTIPROC_DIR', None)
+
+    processes = []
+    try:
+        if fanout and 'fanout' not in skip:
+            processes.append(subprocess.Popen(
+                [sys.executable, os.path.join(BENCH_DIR, 'fake_ssh_server.py'), '--hosts', str(max(fanout)),
+                 '--base-port', str(args.base_port), '--password', SSH_PASSWORD, '--latency', str(args.latency),
+                 '--output-lines', str(args.output_lines), '--line-bytes', str(args.line_bytes)],
+                stdout=subprocess.DEVNULL))
+            wait_for_port(args.base_port + max(fanout) - 1)
+        if 'rest' in backends:
+            processes.append(subprocess.Popen(
+                [sys.executable, os.path.join(REPO_DIR, 'tools', 'fake_compute_api.py'), '--port', str(args.compute_port),
+                 '--instances', str(args.instances), '--latency', str(args.gcloud_latency / 10)],
+                stdout=subprocess.DEVNULL))
+            wait_for_port(args.compute_port)
+
+        app = load_app(workdir, args)
+        results = {
+            'timestamp': time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime()),
+            'git_commit': git_commit(),
+            'python': platform.python_version(),
+            'parameters': vars(args),
+            'scenarios': {},
+        }
+        scenarios = results['scenarios']
+        if 'fanout' not in skip:
+            for host_count in fanout:
+                print(f'fanout-{host_count}...', file=sys.stderr)
+                scenarios[f'fanout-{host_count}'] = bench_fanout(app, host_count, args)
+        for backend in backends:
+            set_backend(app, backend)
+            if 'get-vms' not in skip:
+                print(f'get-vms-polling ({backend})...', file=sys.stderr)
+                scenarios[f'get-vms-polling-{backend}'] = bench_get_vms(app, args, backend)
+            if 'start-vms' not in skip:
+                print(f'start-vms-bulk ({backend})...', file=sys.stderr)
+                scenarios[f'start-vms-bulk-{backend}'] = bench_start_vms(app, args, backend)
+    finally:
+        for process in processes:
+            process.terminate()
+        os.chdir(REPO_DIR)
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    report = json.dumps(results, indent=2)
+    print(report)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(report + '\n')
+
+
+if __name__ == '__main__':
+    main()
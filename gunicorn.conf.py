@@ -0,0 +1,78 @@
+# Gunicorn configuration for FabricStudio Controller
+bind = '0.0.0.0:8000'
+workers = 4
+
+# Threaded workers: a streamed command run (/execute-stream) keeps its
+# response open for as long as the remote hosts take, which would block a
+# sync worker and get it killed by the worker timeout. Streamed runs,
+# /vms/stream and /api/logs?follow=1 together may use at most FSC_MAX_STREAMS
+# (default 4) of the threads per worker; keep threads above that.
+worker_class = 'gthread'
+threads = 8
+timeout = 120
+
+# Prometheus metrics: each worker writes its samples to this directory and
+# /metrics adds them up. It must be set before the workers import the app,
+# and is emptied at startup so samples from a previous run do not linger.
+import os
+import shutil
+import subprocess
+import sys
+import threading
+import time
+
+prometheus_dir = os.environ.setdefault('PROMETHEUS_MULTIPROC_DIR', '/tmp/fsc-prometheus')
+
+# Logging: workers forward their records to one log writer process, the only
+# one that writes and rotates logs/*.log (see log_writer.py). The master
+# restarts it if it exits; meanwhile workers write their records to stderr.
+log_socket = os.environ.setdefault('FSC_LOG_SOCKET', '/tmp/fsc-log.sock')
+log_writer_process = None
+log_writer_stopping = False
+
+
+def start_log_writer():
+    global log_writer_process
+    if os.path.exists(log_socket):
+        os.unlink(log_socket)
+    log_writer_process = subprocess.Popen(
+        [sys.executable, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'log_writer.py'),
+         '--socket', log_socket])
+    # Workers fall back to stderr until the socket exists, so wait for it
+    deadline = time.monotonic() + 10
+    while not os.path.exists(log_socket) and time.monotonic() < deadline:
+        time.sleep(0.05)
+
+
+def watch_log_writer(log):
+    while True:
+        returncode = log_writer_process.wait()
+        if log_writer_stopping:
+            return
+        log.error('Log writer exited with status %s, restarting it', returncode)
+        time.sleep(1)  # do not spin if it keeps failing on startup
+        start_log_writer()
+
+
+def on_starting(server):
+    shutil.rmtree(prometheus_dir, ignore_errors=True)
+    os.makedirs(prometheus_dir, exist_ok=True)
+
+    start_log_writer()
+    threading.Thread(target=watch_log_writer, args=(server.log,), name='log-writer-watch', daemon=True).start()
+
+
+def on_exit(server):
+    global log_writer_stopping
+    log_writer_stopping = True
+    if log_writer_process is not None:
+        log_writer_process.terminate()
+        log_writer_process.wait(timeout=10)
+
+
+def child_exit(server, worker):
+    try:
+        from prometheus_client import multiprocess
+    except ImportError:
+        return
+    multiprocess.mark_process_dead(worker.pid)
@@ -0,0 +1,180 @@
+#!/usr/bin/env python3
+"""Single writer for the controller's access and event logs.
+
+Every gunicorn worker queues its log records in memory and a background
+thread forwards them over a unix socket (logging.handlers.SocketHandler) to
+this process, which is the only one that opens and rotates the files in
+logs/. gunicorn.conf.py starts it and restarts it if it exits; while a
+worker cannot reach it, records go to the worker's stderr instead. When the
+app runs on its own (``python app.py``) the same handlers are used
+in-process.
+
+Set FSC_LOG_FORMAT=json to write JSON lines (logs/access.jsonl and
+logs/events.jsonl) instead of the plain-text logs.
+"""
+import argparse
+import json
+import logging
+import os
+import pickle
+import signal
+import socketserver
+import struct
+import sys
+from datetime import datetime
+from logging.handlers import RotatingFileHandler, SocketHandler
+
+LOG_MAX_BYTES = 10 * 1024 * 1024  # 10MB
+LOG_BACKUP_COUNT = 10
+ACCESS_FIELDS = ('remote_addr', 'method', 'path', 'status', 'user_agent')
+TEXT_FORMATS = {
+    'access': '%(asctime)s | %(remote_addr)s | %(method)s | %(path)s | %(status)s | %(user_agent)s',
+    'events': '%(asctime)s | %(levelname)s | %(message)s',
+}
+
+
+class JSONLinesFormatter(logging.Formatter):
+    """One JSON object per record, including the access fields and log_event() context."""
+
+    def format(self, record):
+        entry = {
+            'time': datetime.fromtimestamp(record.created).isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'logger': record.name,
+        }
+        if record.name == 'access':
+            entry.update({field: getattr(record, field, None) for field in ACCESS_FIELDS})
+        else:
+            entry['message'] = getattr(record, 'event', None) or record.getMessage()
+            entry.update(getattr(record, 'fields', None) or {})
+        return json.dumps(entry, default=str)
+
+
+class DispatchHandler(logging.Handler):
+    """Send each record to the handler for its logger name ('access' or 'events')."""
+
+    def __init__(self, handlers):
+        super().__init__()
+        self.handlers = handlers
+
+    def handle(self, record):
+        handler = self.handlers.get(record.name)
+        if handler is not None:
+            handler.handle(record)
+        return True
+
+    def close(self):
+        for handler in self.handlers.values():
+            handler.close()
+        super().close()
+
+
+def build_handlers(log_dir='logs', json_lines=None):
+    """Rotating file handlers for the access and event logs, keyed by logger name."""
+    if json_lines is None:
+        json_lines = os.environ.get('FSC_LOG_FORMAT', 'text') == 'json'
+    os.makedirs(log_dir, exist_ok=True)
+    if json_lines:
+        formats = {'access': ('access.jsonl', JSONLinesFormatter()), 'events': ('events.jsonl', JSONLinesFormatter())}
+    else:
+        formats = {
+            'access': ('access.log', logging.Formatter(TEXT_FORMATS['access'])),
+            'events': ('events.log', logging.Formatter(TEXT_FORMATS['events'])),
+        }
+    handlers = {}
+    for name, (filename, formatter) in formats.items():
+        handler = RotatingFileHandler(os.path.join(log_dir, filename),
+                                      maxBytes=LOG_MAX_BYTES, backupCount=LOG_BACKUP_COUNT)
+        handler.setFormatter(formatter)
+        handlers[name] = handler
+    return handlers
+
+
+class WriterSocketHandler(SocketHandler):
+    """Forward records to the log writer; write them to stderr while it cannot be reached.
+
+    A plain SocketHandler drops records silently when the connection fails,
+    which would hide that the writer process is gone.
+    """
+
+    def __init__(self, socket_path):
+        super().__init__(socket_path, None)
+        stderr_handlers = {}
+        for name, fmt in TEXT_FORMATS.items():
+            stderr_handlers[name] = logging.StreamHandler(sys.stderr)
+            stderr_handlers[name].setFormatter(logging.Formatter(fmt))
+        self.fallback = DispatchHandler(stderr_handlers)
+
+    def emit(self, record):
+        try:
+            data = self.makePickle(record)
+            if self.sock is None:
+                # Retries with backoff, so an absent writer costs no connect per record
+                self.createSocket()
+            if self.sock is not None:
+                self.sock.sendall(data)
+                return
+        except OSError:
+            if self.sock is not None:
+                self.sock.close()
+                self.sock = None
+        except Exception:
+            self.handleError(record)
+            return
+        self.fallback.handle(record)
+
+
+class LogRecordStreamHandler(socketserver.StreamRequestHandler):
+    """Read length-prefixed pickled records as sent by logging.handlers.SocketHandler."""
+
+    def handle(self):
+        while True:
+            header = self.rfile.read(4)
+            if len(header) < 4:
+                return
+            length = struct.unpack('>L', header)[0]
+            data = self.rfile.read(length)
+            if len(data) < length:
+                return
+            record = logging.makeLogRecord(pickle.loads(data))
+            self.server.dispatcher.handle(record)
+
+
+class LogWriterServer(socketserver.ThreadingUnixStreamServer):
+    daemon_threads = True
+
+
+def serve(socket_path, log_dir='logs', json_lines=None):
+    """Accept records from the workers and write them until terminated."""
+    if os.path.exists(socket_path):
+        os.unlink(socket_path)
+    # Only this user may write into the logs (records are unpickled), so the
+    # socket is created 0600 rather than restricted after bind()
+    previous_umask = os.umask(0o177)
+    try:
+        server = LogWriterServer(socket_path, LogRecordStreamHandler)
+    finally:
+        os.umask(previous_umask)
+    server.dispatcher = DispatchHandler(build_handlers(log_dir, json_lines))
+    try:
+        server.serve_forever()
+    finally:
+        server.dispatcher.close()
+        server.server_close()
+        if os.path.exists(socket_path):
+            os.unlink(socket_path)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--socket', default=os.environ.get('FSC_LOG_SOCKET', '/tmp/fsc-log.sock'))
+    parser.add_argument('--log-dir', default='logs')
+    parser.add_argument('--json', action='store_true', default=None, help='write JSON lines')
+    args = parser.parse_args()
+    # Exit through serve()'s cleanup when gunicorn stops us
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+    serve(args.socket, args.log_dir, args.json)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,230 @@
+"""Static asset pipeline: content-hashed, precompressed copies of static/.
+
+build() runs once at startup. Each file under static/ is copied into the
+build directory under a name that includes a hash of its content, e.g.
+style.3f2a9c1b7e4d.css. Compressible files get .gz (and .br, when the
+brotli package is installed) variants next to them, and url() references
+in CSS are rewritten to the hashed names. With Pillow installed, large
+JPEG/PNG images are scaled down and get a WebP variant.
+
+A file's URL changes whenever its content does, so the files can be served
+with `Cache-Control: immutable`. Names are derived from content only, so
+several workers building at the same time write identical files, and
+manifest.json in the build directory lets a restart reuse earlier output.
+"""
+import gzip
+import hashlib
+import io
+import json
+import mimetypes
+import os
+import posixpath
+import re
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+try:
+    from PIL import Image
+except ImportError:
+    Image = None
+
+HASH_LENGTH = 12
+MIN_COMPRESS_SIZE = 512
+COMPRESSIBLE_TYPES = ('text/', 'application/javascript', 'application/json', 'image/svg+xml',
+                      'image/x-icon', 'image/vnd.microsoft.icon')
+RESIZABLE_FORMATS = {'.jpg': 'JPEG', '.jpeg': 'JPEG', '.png': 'PNG'}
+CSS_URL = re.compile(r'''url\(\s*(['"]?)([^'")]+)\1\s*\)''')
+
+
+class AssetManifest:
+    """Built assets, by source path (style.css) and by hashed path."""
+
+    def __init__(self, build_dir, assets):
+        self.build_dir = build_dir
+        self.assets = assets
+        self.by_path = {entry['path']: entry for entry in assets.values()}
+
+    def url_path(self, filename):
+        """Hashed path for a file under static/, or None if it was not built."""
+        entry = self.assets.get(filename)
+        return entry['path'] if entry else None
+
+    def lookup(self, path):
+        return self.by_path.get(path)
+
+    def stats(self):
+        return {
+            'files': len(self.assets),
+            'bytes': sum(entry['size'] for entry in self.assets.values()),
+            'source_bytes': sum(entry['source_size'] for entry in self.assets.values()),
+            'brotli': brotli is not None,
+            'images': Image is not None
+        }
+
+
+def hashed_name(path, digest):
+    root, ext = posixpath.splitext(path)
+    return f'{root}.{digest}{ext}'
+
+
+def write_file(build_dir, path, data, overwrite=False):
+    """Write a build output atomically, unless an identical file is already there."""
+    target = os.path.join(build_dir, *path.split('/'))
+    # Outputs are named after their content, so an existing one is the same file
+    if not overwrite and os.path.exists(target) and os.path.getsize(target) == len(data):
+        return
+    os.makedirs(os.path.dirname(target), exist_ok=True)
+    tmp = f'{target}.{os.getpid()}.tmp'
+    with open(tmp, 'wb') as f:
+        f.write(data)
+    os.replace(tmp, target)
+
+
+def optimize_image(data, ext, max_width):
+    """Return (image bytes, WebP bytes or None), scaled down to max_width if wider."""
+    if Image is None or ext not in RESIZABLE_FORMATS:
+        return data, None
+    try:
+        image = Image.open(io.BytesIO(data))
+        image.load()
+    except Exception:
+        return data, None
+    if max_width and image.width > max_width:
+        image = image.resize((max_width, round(image.height * max_width / image.width)), Image.LANCZOS)
+        out = io.BytesIO()
+        if RESIZABLE_FORMATS[ext] == 'JPEG':
+            image.convert('RGB').save(out, 'JPEG', quality=85, optimize=True, progressive=True)
+        else:
+            image.save(out, 'PNG', optimize=True)
+        if out.tell() < len(data):
+            data = out.getvalue()
+    webp = io.BytesIO()
+    try:
+        image.save(webp, 'WEBP', quality=80, method=6)
+    except Exception:
+        return data, None
+    return data, webp.getvalue() if webp.tell() < len(data) else None
+
+
+def compressed_variants(data, mimetype):
+    """Precompressed encodings of data that are worth serving, by Content-Encoding."""
+    variants = {}
+    if len(data) < MIN_COMPRESS_SIZE or not (mimetype or '').startswith(COMPRESSIBLE_TYPES):
+        return variants
+    if brotli is not None:
+        variants['br'] = brotli.compress(data, quality=11)
+    variants['gzip'] = gzip.compress(data, 9, mtime=0)
+    return {encoding: body for encoding, body in variants.items() if len(body) < len(data) * 0.9}
+
+
+def rewrite_css(data, path, assets):
+    """Point url() references in a stylesheet at the hashed names of the files."""
+    base = posixpath.dirname(path)
+
+    def replace(match):
+        url = match.group(2).strip()
+        if re.match(r'^(data:|[a-z]+:|//|#)', url, re.I):
+            return match.group(0)
+        target = posixpath.normpath(posixpath.join(base, re.split(r'[?#]', url)[0]))
+        if target not in assets:
+            return match.group(0)
+        return f"url('{posixpath.relpath(assets[target]['path'], base or '.')}')"
+
+    return CSS_URL.sub(replace, data.decode('utf-8')).encode('utf-8')
+
+
+def load_previous(build_dir):
+    try:
+        with open(os.path.join(build_dir, 'manifest.json'), 'r') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def outputs_exist(build_dir, entry):
+    paths = [entry['path'], *entry['encodings'].values(), *entry['alternates'].values()]
+    return all(os.path.exists(os.path.join(build_dir, *path.split('/'))) for path in paths)
+
+
+def build(static_dir, build_dir, image_max_width=1920):
+    """Build hashed and precompressed copies of every file under static_dir."""
+    previous = load_previous(build_dir)
+    options = f'{image_max_width}:{brotli is not None}:{Image is not None}'.encode()
+    sources = []
+    for root, _, files in os.walk(static_dir):
+        for name in files:
+            sources.append(os.path.relpath(os.path.join(root, name), static_dir).replace(os.sep, '/'))
+    # Stylesheets last, so the files they reference already have their hashed names
+    sources.sort(key=lambda path: (path.endswith('.css'), path))
+
+    assets = {}
+    for path in sources:
+        with open(os.path.join(static_dir, *path.split('/')), 'rb') as f:
+            data = f.read()
+        source_size = len(data)
+        ext = posixpath.splitext(path)[1].lower()
+        mimetype = mimetypes.guess_type(path)[0] or 'application/octet-stream'
+        if ext == '.css':
+            data = rewrite_css(data, path, assets)
+        key = hashlib.sha256(options + data).hexdigest()
+        entry = previous.get(path)
+        if entry and entry.get('key') == key and outputs_exist(build_dir, entry):
+            assets[path] = entry
+            continue
+        data, webp = optimize_image(data, ext, image_max_width)
+
+        digest = hashlib.sha256(data).hexdigest()[:HASH_LENGTH]
+        entry = {'source': path, 'path': hashed_name(path, digest), 'digest': digest, 'mimetype': mimetype,
+                 'size': len(data), 'source_size': source_size, 'key': key, 'encodings': {}, 'alternates': {}}
+        write_file(build_dir, entry['path'], data)
+        for encoding, body in compressed_variants(data, mimetype).items():
+            suffix = '.br' if encoding == 'br' else '.gz'
+            write_file(build_dir, entry['path'] + suffix, body)
+            entry['encodings'][encoding] = entry['path'] + suffix
+        if webp is not None:
+            webp_path = posixpath.splitext(entry['path'])[0] + '.webp'
+            write_file(build_dir, webp_path, webp)
+            entry['alternates']['image/webp'] = webp_path
+        assets[path] = entry
+    write_file(build_dir, 'manifest.json', json.dumps(assets, indent=2, sort_keys=True).encode(), overwrite=True)
+    return AssetManifest(build_dir, assets)
+
+
+def header_tokens(header):
+    """Values of a comma-separated header with a q-value above 0, lower-cased."""
+    tokens = set()
+    for part in (header or '').split(','):
+        value, *params = [item.strip() for item in part.split(';')]
+        quality = 1.0
+        for param in params:
+            if param.startswith('q='):
+                try:
+                    quality = float(param[2:])
+                except ValueError:
+                    quality = 0.0
+        if value and quality > 0:
+            tokens.add(value.lower())
+    return tokens
+
+
+def select_variant(entry, accept_encoding, accept):
+    """Pick the file to serve for a request: (path, mimetype, Content-Encoding or None, Vary headers).
+
+    Only an explicit image/webp in Accept selects the WebP alternate; a
+    wildcard does not, since every browser sends one.
+    """
+    vary = []
+    if entry['alternates']:
+        vary.append('Accept')
+        if 'image/webp' in entry['alternates'] and 'image/webp' in header_tokens(accept):
+            return entry['alternates']['image/webp'], 'image/webp', None, vary
+    if entry['encodings']:
+        vary.append('Accept-Encoding')
+        encodings = header_tokens(accept_encoding)
+        for encoding in ('br', 'gzip'):
+            if encoding in entry['encodings'] and encoding in encodings:
+                return entry['encodings'][encoding], entry['mimetype'], encoding, vary
+    return entry['path'], entry['mimetype'], None, vary
@@ -0,0 +1,171 @@
+#!/usr/bin/env python3
+"""Local stand-in for the Compute Engine REST API.
+
+Serves just enough of the API for the controller's REST VM backend:
+paginated aggregated instance listing (with ``name eq "<regex>"`` filters)
+and the start/stop/reset/suspend/resume instance actions. Use it to test or
+benchmark the REST backend offline:
+
+    python tools/fake_compute_api.py --port 8085 --instances 200 --latency 0.05
+
+and in commands.json:
+
+    "_config": {
+        "vm_backend": "rest",
+        "compute_api_endpoint": "http://127.0.0.1:8085/compute/v1",
+        "gcp_project": "fake-project"
+    }
+
+with GOOGLE_OAUTH_ACCESS_TOKEN set to any value.
+"""
+import argparse
+import json
+import re
+import threading
+import time
+import urllib.parse
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+ZONES = ['europe-west4-a', 'europe-west4-b', 'europe-west1-b', 'us-central1-a']
+ACTION_STATUS = {
+    'start': 'RUNNING',
+    'resume': 'RUNNING',
+    'reset': 'RUNNING',
+    'stop': 'TERMINATED',
+    'suspend': 'SUSPENDED',
+}
+
+
+class FakeCompute:
+    """In-memory set of instances for one project."""
+
+    def __init__(self, project, count, prefix):
+        self.project = project
+        self.lock = threading.Lock()
+        self.instances = {}
+        for i in range(1, count + 1):
+            zone = ZONES[i % len(ZONES)]
+            name = f'{prefix}-{i}'
+            self.instances[(zone, name)] = {
+                'name': name,
+                'zone': f'https://www.googleapis.com/compute/v1/projects/{project}/zones/{zone}',
+                'status': 'RUNNING' if i % 3 else 'TERMINATED',
+                'ip': f'10.{i // 65536 % 256}.{i // 256 % 256}.{i % 256}',
+            }
+
+    @staticmethod
+    def render(instance):
+        access_configs = [{'natIP': instance['ip']}] if instance['status'] == 'RUNNING' else []
+        return {
+            'name': instance['name'],
+            'zone': instance['zone'],
+            'status': instance['status'],
+            'networkInterfaces': [{'accessConfigs': access_configs}],
+        }
+
+    def aggregated_list(self, params):
+        with self.lock:
+            instances = sorted(self.instances.items())
+        name_filter = re.match(r'^name eq "(.*)"$', params.get('filter', ''))
+        if name_filter:
+            pattern = re.compile(name_filter.group(1))
+            instances = [(key, inst) for key, inst in instances if pattern.fullmatch(inst['name'])]
+        max_results = min(int(params.get('maxResults', 500)), 500)
+        offset = int(params.get('pageToken', 0) or 0)
+        page = instances[offset:offset + max_results]
+        items = {}
+        for (zone, _), instance in page:
+            items.setdefault(f'zones/{zone}', {'instances': []})['instances'].append(self.render(instance))
+        body = {'kind': 'compute#instanceAggregatedList', 'items': items}
+        if offset + max_results < len(instances):
+            body['nextPageToken'] = str(offset + max_results)
+        return body
+
+    def action(self, zone, name, action):
+        with self.lock:
+            instance = self.instances.get((zone, name))
+            if instance is None:
+                return None
+            instance['status'] = ACTION_STATUS[action]
+        return {
+            'kind': 'compute#operation',
+            'name': f'operation-{int(time.time() * 1000)}',
+            'operationType': action,
+            'targetLink': f"{instance['zone']}/instances/{name}",
+            'status': 'RUNNING',
+        }
+
+
+def make_handler(compute, latency):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'  # keep-alive, like the real API
+
+        def log_message(self, format, *args):
+            pass
+
+        def send_json(self, status, body):
+            data = json.dumps(body).encode()
+            self.send_response(status)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def error(self, status, message):
+            self.send_json(status, {'error': {'code': status, 'message': message}})
+
+        def route(self, method):
+            if latency:
+                time.sleep(latency)
+            if not self.headers.get('Authorization', '').startswith('Bearer '):
+                return self.error(401, 'Request is missing required authentication credential.')
+            parsed = urllib.parse.urlsplit(self.path)
+            params = dict(urllib.parse.parse_qsl(parsed.query))
+            parts = parsed.path.strip('/').split('/')
+            # compute/v1/projects/<project>/...
+            if parts[:2] != ['compute', 'v1'] or len(parts) < 4 or parts[2] != 'projects':
+                return self.error(404, f'Unknown path {parsed.path}')
+            if parts[3] != compute.project:
+                return self.error(404, f"The resource 'projects/{parts[3]}' was not found")
+            rest = parts[4:]
+            if method == 'GET' and rest == ['aggregated', 'instances']:
+                return self.send_json(200, compute.aggregated_list(params))
+            if method == 'POST' and len(rest) == 5 and rest[0] == 'zones' and rest[2] == 'instances' \
+                    and rest[4] in ACTION_STATUS:
+                operation = compute.action(rest[1], rest[3], rest[4])
+                if operation is None:
+                    return self.error(404, f"The resource 'projects/{compute.project}/zones/{rest[1]}/instances/{rest[3]}' was not found")
+                return self.send_json(200, operation)
+            return self.error(404, f'Unknown path {parsed.path}')
+
+        def do_GET(self):
+            self.route('GET')
+
+        def do_POST(self):
+            length = int(self.headers.get('Content-Length') or 0)
+            if length:
+                self.rfile.read(length)
+            self.route('POST')
+
+    return Handler
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8085)
+    parser.add_argument('--project', default='fake-project')
+    parser.add_argument('--instances', type=int, default=60, help='number of fake instances')
+    parser.add_argument('--prefix', default='sru-fstudio-faz', help='instance name prefix')
+    parser.add_argument('--latency', type=float, default=0.0, help='seconds added to every request')
+    args = parser.parse_args()
+
+    compute = FakeCompute(args.project, args.instances, args.prefix)
+    server = ThreadingHTTPServer((args.host, args.port), make_handler(compute, args.latency))
+    print(f'Fake Compute API for project {args.project} with {args.instances} instances on '
+          f'http://{args.host}:{args.port}/compute/v1')
+    server.serve_forever()
+
+
+if __name__ == '__main__':
+    main()